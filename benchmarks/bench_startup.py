@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+""" Compare the start up time of the fast `dice` entry point with the full
+one.
+
+Each command is run in a fresh interpreter, and the best wall clock time is
+reported along with the time `python -X importtime` attributes to importing
+the entry point's module.
+
+Run from the top of the repository with:
+
+    python benchmarks/bench_startup.py
+
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+COMMANDS = (
+    ("empty interpreter", "pass", None),
+    ("dice.cli 3d6", "from dice.cli import main; main(['3d6'])", "dice.cli"),
+    ("dice.cli 4d6-L", "from dice.cli import main; main(['4d6-L'])", "dice.cli"),
+    ("dice.dice 3d6", "from dice.dice import main; main(['3d6'])", "dice.dice"),
+)
+REPEAT = 10
+
+
+def wall_time(code):
+    """ Return the best time in seconds to run code in a new interpreter. """
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=REPO, stdout=subprocess.DEVNULL, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def import_time(code, module):
+    """ Return the cumulative import time of module, in seconds, as reported
+    by `python -X importtime`.
+
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1e6
+    return None
+
+
+def main():
+    print("{:<20} {:>10} {:>12}".format("command", "wall (ms)", "import (ms)"))
+    for name, code, module in COMMANDS:
+        seconds = import_time(code, module) if module else None
+        print("{:<20} {:>10.1f} {:>12}".format(
+            name, wall_time(code) * 1e3, "" if seconds is None else "{:.1f}".format(seconds * 1e3),
+        ))
+
+
+if __name__ == '__main__':
+    main()
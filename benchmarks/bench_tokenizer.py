@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+""" Compare the speed of the character-by-character tokenizer with the
+regular expression tokenizer.
+
+Run from the top of the repository with:
+
+    python benchmarks/bench_tokenizer.py
+
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dice.dice import CharDiceTokenizer, DiceTokenizer  # noqa: E402
+
+
+NOTATIONS = (
+    "1d20",
+    "4d6-L",
+    "100d6+5",
+    "3(d6+1)",
+    "4dF",
+    "5(d10-1)+15-3L-H",
+)
+NUMBER = 20000
+
+
+def best_time(function, number=NUMBER, repeat=5):
+    """ Return the fastest time per call in seconds. """
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def main():
+    print("{:<20} {:>12} {:>12} {:>8}".format("notation", "char (us)", "regex (us)", "speedup"))
+    for notation in NOTATIONS:
+        char_time = best_time(lambda: tuple(CharDiceTokenizer(notation)))
+        regex_time = best_time(lambda: tuple(DiceTokenizer(notation)))
+        print("{:<20} {:>12.2f} {:>12.2f} {:>7.1f}x".format(
+            notation, char_time * 1e6, regex_time * 1e6, char_time / regex_time,
+        ))
+
+    batch = list(NOTATIONS) * 100
+    char_time = best_time(lambda: [tuple(CharDiceTokenizer(notation)) for notation in batch], number=50)
+    many_time = best_time(lambda: DiceTokenizer.tokenize_many(batch), number=50)
+    print("{:<20} {:>12.2f} {:>12.2f} {:>7.1f}x".format(
+        "tokenize_many", char_time * 1e6 / len(batch), many_time * 1e6 / len(batch), char_time / many_time,
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/python3
+""" Measure the speed and memory use of each stage of rolling dice.
+
+Every stage (tokenize, parse, construct, roll and distribution) is run on a
+set of representative notations, and the operations per second and the peak
+memory allocated by one operation are reported. The results can be saved as
+JSON and compared against a saved baseline.
+
+Run from the top of the repository with:
+
+    python benchmarks/run.py --output results.json --baseline baseline.json
+
+The command exits with status 1 if any stage is slower than the baseline by
+more than the threshold.
+
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import dice.dice  # noqa: E402
+from dice.dice import (  # noqa: E402
+    PARSE_CACHE,
+    Dice,
+    DiceTable,
+    DiceTokenizer,
+    LLParser,
+    RandomStream,
+    split_expression,
+)
+
+
+NOTATIONS = (
+    "1d20",
+    "4d6-L",
+    "100d6+5",
+    "3(d6+1)",
+    "4dF",
+)
+
+# The caches that hold exact distributions, cleared so that every
+# distribution is computed from scratch
+DISTRIBUTION_CACHES = (
+    "_die_faces",
+    "_die_distribution",
+    "_pool_distribution",
+    "_drop_distribution",
+)
+
+
+def clear_distribution_caches():
+    """ Empty every cache of exact distributions. """
+    for name in DISTRIBUTION_CACHES:
+        getattr(dice.dice, name).cache_clear()
+
+
+def construct_cold(notation):
+    """ Build Dice without the help of the parse cache. """
+    PARSE_CACHE.clear()
+    return Dice(notation)
+
+
+def distribution_cold(plan):
+    """ Compute a distribution without the help of its caches. """
+    clear_distribution_caches()
+    return plan.distribution()
+
+
+def stages(notation):
+    """ Return an ordered list of (stage, function) pairs for a notation. """
+    tokens = DiceTokenizer.tokenize(notation)
+    term_tokens = split_expression(tokens)[0][0][1]
+    plan = Dice(notation).plan
+    rng = RandomStream(0)
+
+    return [
+        ("tokenize", lambda: DiceTokenizer.tokenize(notation)),
+        ("parse", lambda: LLParser(DiceTable(), term_tokens)),
+        ("construct", lambda: Dice(notation)),
+        ("construct_cold", lambda: construct_cold(notation)),
+        ("roll", lambda: plan.roll(rng=rng)),
+        ("distribution", lambda: distribution_cold(plan)),
+    ]
+
+
+def ops_per_second(function, min_time, repeat):
+    """ Return the best rate, in calls per second, over repeat timings that
+    each last at least min_time seconds.
+
+    """
+    timer = timeit.Timer(function)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+
+    return number / min(timer.repeat(repeat=repeat, number=number))
+
+
+def peak_bytes(function):
+    """ Return the peak memory, in bytes, allocated while calling function
+    once.
+
+    """
+    function()  # Warm any caches the stage is meant to use
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak
+
+
+def run(notations=NOTATIONS, min_time=0.05, repeat=5):
+    """ Run every stage on every notation and return the results as a
+    dictionary of {stage: {notation: {"ops_per_sec": ..., "peak_bytes": ...}}}.
+
+    """
+    results = {}
+    for notation in notations:
+        for stage, function in stages(notation):
+            results.setdefault(stage, {})[notation] = {
+                "ops_per_sec": ops_per_second(function, min_time, repeat),
+                "peak_bytes": peak_bytes(function),
+            }
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ Return a list of (stage, notation, ratio) for every result slower than
+    the baseline by more than threshold, where ratio is the new rate over the
+    old one.
+
+    """
+    regressions = []
+    for stage, notations in sorted(results.items()):
+        for notation, result in sorted(notations.items()):
+            old = baseline.get(stage, {}).get(notation)
+            if old is None:
+                continue
+            ratio = result["ops_per_sec"] / old["ops_per_sec"]
+            if ratio < 1. - threshold:
+                regressions.append((stage, notation, ratio))
+
+    return regressions
+
+
+def report(results, baseline=None):
+    """ Print a table of the results, with the change from the baseline. """
+    print("{:<16} {:<10} {:>14} {:>12} {:>10}".format("stage", "notation", "ops/sec", "peak bytes", "change"))
+    for stage, notations in results.items():
+        for notation, result in notations.items():
+            change = ""
+            old = (baseline or {}).get(stage, {}).get(notation)
+            if old is not None:
+                change = "{:+.1%}".format(result["ops_per_sec"] / old["ops_per_sec"] - 1.)
+            print("{:<16} {:<10} {:>14,.0f} {:>12,} {:>10}".format(
+                stage, notation, result["ops_per_sec"], result["peak_bytes"], change,
+            ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each stage of rolling dice.")
+    parser.add_argument("-o", "--output", metavar="FILE", help="save the results as JSON to FILE")
+    parser.add_argument("-b", "--baseline", metavar="FILE", help="compare against the JSON results in FILE")
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="the fractional slowdown from the baseline that counts as a regression, defaults to 0.2",
+    )
+    parser.add_argument("--quick", action="store_true", help="time fewer and shorter runs")
+    args = parser.parse_args()
+
+    min_time, repeat = (0.01, 2) if args.quick else (0.05, 5)
+    results = run(min_time=min_time, repeat=repeat)
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+    report(results, baseline)
+
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "numpy": dice.dice._numpy() is not None,
+                    "results": results,
+                },
+                output_file,
+                indent=2,
+                sort_keys=True,
+            )
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for stage, notation, ratio in regressions:
+            print("REGRESSION: {} {!r} runs at {:.0%} of the baseline rate".format(stage, notation, ratio))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+""" The entry point of the `dice` console script, tuned for start up time.
+
+Importing `dice.dice` pulls in argparse, logging, enum, re and the whole
+parser, which takes far longer than rolling the dice. Most calls from
+scripts roll a plain "NdM", possibly summed, so those are handled here with
+nothing but the `random` module. Everything else is passed on to
+`dice.dice.main()`, which is only imported when it is needed.
+
+"""
+
+import sys
+
+
+DIGITS = frozenset("0123456789")
+SUM_FLAGS = frozenset(["-s", "--sum"])
+
+
+def parse_simple(argv):
+    """ Return (number, size, do_sum) if argv is just a plain "NdM" notation
+    and an optional sum flag, or None otherwise.
+
+    Only notations that the full parser would accept, with the same values,
+    are returned, so anything else falls back to `dice.dice.main()`.
+
+    """
+    if not 1 <= len(argv) <= 2:
+        return None
+
+    flags = [arg for arg in argv if arg in SUM_FLAGS]
+    notations = [arg for arg in argv if arg not in SUM_FLAGS]
+    if len(notations) != 1 or len(flags) != len(argv) - 1:
+        return None
+
+    number, d, size = notations[0].partition("d")
+    if not (d and number and size and DIGITS.issuperset(number) and DIGITS.issuperset(size)):
+        return None
+
+    number = int(number)
+    size = int(size)
+    # Leave the error messages for invalid dice to the full parser
+    if number < 1 or size < 2:
+        return None
+
+    return (number, size, bool(flags))
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    simple = parse_simple(argv)
+    if simple is None:
+        from dice.dice import main as full_main
+        return full_main(argv)
+
+    number, size, do_sum = simple
+    values = draw(number, size)
+    print(sum(values) if do_sum else values)
+
+
+def draw(number, size):
+    """ Return the values of number dice of the given size, drawn from the
+    global random module.
+
+    These are the same values that `dice.dice.RandomStream.integers()` draws
+    for Dice built without an rng, which tests/test_cli.py checks. The code is
+    repeated rather than shared because `dice/dice.py` can also be run as a
+    script on its own, so it can not import from the package.
+
+    """
+    import random
+
+    uniform = random.random
+    span = float(size)
+    return [1 + int(uniform() * span) for _ in range(number)]
+
+
+if __name__ == '__main__':
+    main()
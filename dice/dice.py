@@ -1,9 +1,56 @@
 #!/usr/bin/python3
 
-from random import randint
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict, namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
 from enum import Enum, unique
 import argparse
+import hashlib
+import heapq
+import itertools
 import logging
+import math
+import operator
+import os
+import random
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+import weakref
+
+# NumPy is optional; it is used for batch rolling when it is installed. It
+# takes longer to import than the rest of the module, so it is imported by
+# _numpy() the first time it is needed, and is None if it is not installed.
+_NUMPY_NOT_LOADED = object()
+numpy = _NUMPY_NOT_LOADED
+
+
+def _numpy():
+    """ Return the numpy module, or None if NumPy is not installed. """
+    global numpy
+    if numpy is _NUMPY_NOT_LOADED:
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+        numpy = module
+    return numpy
+
+
+def is_tracing():
+    """ Return True if detailed per-token and per-die logging is enabled.
+
+    This is checked once when a tokenizer, parser, table, or Dice is built,
+    so that the hot loops make no logging calls at all unless debug logging
+    was on at that point.
+
+    """
+    return logging.getLogger().isEnabledFor(logging.DEBUG)
 
 
 @unique
@@ -17,13 +64,29 @@ class StackToken(Enum):
     drop_mod = 7
     drop_high = 8
     drop_low = 9
+    die_mod = 10
+    reroll = 11
+    explode = 12
+    success_mod = 13
+    success = 14
 
+    # Members are singletons compared by identity, so hash them by identity
+    # too; the parser looks them up in dictionaries for every token.
+    __hash__ = object.__hash__
 
-class DiceTokenizer:
-    """ Returns a dice token """
+
+class CharDiceTokenizer:
+    """ Returns a dice token, reading the input one character at a time.
+
+    This is the original tokenizer; DiceTokenizer produces the same tokens
+    much faster and is used by default.
+
+    """
     def __init__(self, input_str):
         """ """
-        logging.info("Input string for tokenization: %s", input_str)
+        self.trace = is_tracing()
+        if self.trace:
+            logging.info("Input string for tokenization: %s", input_str)
         self.input = input_str
         self.end = len(self.input)
 
@@ -40,13 +103,15 @@ class DiceTokenizer:
 
     def __make_iter(self):
         """ Return next item in iterator. """
+        trace = self.trace
         buffer = ''
         for i in range(self.end):
             char = self.input[i]
 
             # End of stream check, where we yield all remaining
             if i == self.end - 1 and char in self.INT_CHARS.union(self.LH_CHARS).union(self.FATE_CHARS):
-                logging.debug("Yielding: %s", buffer + char)
+                if trace:
+                    logging.debug("Yielding: %s", buffer + char)
                 yield buffer + char
 
             # Handle symbols
@@ -57,7 +122,8 @@ class DiceTokenizer:
                 else:
                     # But if we already have a buffer, we yield it,
                     # and start a new one to avoid "-3-"
-                    logging.debug("Yielding: %s", buffer)
+                    if trace:
+                        logging.debug("Yielding: %s", buffer)
                     yield buffer
                     buffer = char
 
@@ -75,10 +141,12 @@ class DiceTokenizer:
             # by ")". This is why we yield twice, and not add them together.
             elif char in self.PARENS:
                 if buffer:
-                    logging.debug("Yielding: %s", buffer)
+                    if trace:
+                        logging.debug("Yielding: %s", buffer)
                     yield buffer
                     buffer = ''
-                logging.debug("Yielding: %s", char)
+                if trace:
+                    logging.debug("Yielding: %s", char)
                 yield char
 
             # Something illegal!
@@ -87,73 +155,351 @@ class DiceTokenizer:
                 raise ValueError(err)
 
 
+class DiceTokenizer:
+    """ Returns a dice token, splitting the input with a single precompiled
+    regular expression.
+
+    Produces the same tokens as CharDiceTokenizer, and also splits out the
+    reroll ('r1'), explode ('!' or '!3') and success ('>=8') modifiers, which
+    CharDiceTokenizer does not support. Whitespace is skipped where it
+    separates the terms of an expression, next to a '+' or '-' sign, and is
+    illegal anywhere else.
+
+    """
+    # A token is an optional sign or 'd' followed by digits, Fate, or drop
+    # characters, a die modifier or comparison followed by digits, or a single
+    # parenthesis.
+    TOKEN_RE = re.compile(r"[+\-d][0-9FLlHh]*|[0-9FLlHh]+|r[0-9]*|![0-9]*|[<>]=?[0-9]*|=[0-9]*|[()]")
+    ILLEGAL_RE = re.compile(r"[^0-9FLlHh+\-d()r!<>=\s]")
+    WHITESPACE_RE = re.compile(r"\s+")
+    SEPARATOR_CHARS = frozenset(['+', '-'])
+    SYMBOL_CHARS = frozenset(['+', '-', 'd'])
+
+    def __init__(self, input_str):
+        self.trace = is_tracing()
+        if self.trace:
+            logging.info("Input string for tokenization: %s", input_str)
+        self.input = input_str
+
+    def __iter__(self):
+        """ Allows iteration over self. """
+        tokens = self.tokenize(self.input)
+        if self.trace:
+            logging.debug("Yielding: %s", tokens)
+        return iter(tokens)
+
+    @classmethod
+    def tokenize(cls, input_str):
+        """ Return the tuple of tokens in input_str.
+
+        Raises:
+            ValueError: If input_str contains an illegal character.
+
+        """
+        illegal = cls.ILLEGAL_RE.search(input_str)
+        if illegal:
+            err = "Illegal character '{}' found in dice format string!".format(illegal.group())
+            raise ValueError(err)
+
+        if cls.WHITESPACE_RE.search(input_str):
+            input_str = cls.skip_whitespace(input_str)
+
+        tokens = cls.TOKEN_RE.findall(input_str)
+        # A sign or 'd' on its own at the very end is never a complete token
+        if tokens and tokens[-1] in cls.SYMBOL_CHARS:
+            tokens.pop()
+
+        return tuple(tokens)
+
+    @classmethod
+    def skip_whitespace(cls, input_str):
+        """ Return input_str without the whitespace that separates its terms.
+
+        Raises:
+            ValueError: If there is whitespace that is not next to a '+' or
+                '-' sign, such as between two digits or inside a set of dice.
+
+        """
+        input_str = input_str.strip()
+        for space in cls.WHITESPACE_RE.finditer(input_str):
+            before = input_str[space.start() - 1]
+            after = input_str[space.end()]
+            if before not in cls.SEPARATOR_CHARS and after not in cls.SEPARATOR_CHARS:
+                err = "Illegal character '{}' found in dice format string!".format(space.group()[0])
+                raise ValueError(err)
+
+        return cls.WHITESPACE_RE.sub("", input_str)
+
+    @classmethod
+    def tokenize_many(cls, input_strs):
+        """ Return a list with the tuple of tokens for each input string.
+
+        Repeated strings are only tokenized once.
+
+        Raises:
+            ValueError: If any input string contains an illegal character.
+
+        """
+        tokenize = cls.tokenize
+        seen = {}
+        output = []
+        for input_str in input_strs:
+            tokens = seen.get(input_str)
+            if tokens is None:
+                tokens = seen[input_str] = tokenize(input_str)
+            output.append(tokens)
+
+        return output
+
+
+class Grammar:
+    """ An LL(1) parse table computed from a grammar written in BNF.
+
+    Symbols written as `StackToken.name` are looked up in StackToken, quoted
+    strings are literal tokens, and "" is the empty string. Symbols that
+    appear on the left of a rule are nonterminals, and the rest are
+    terminals. A terminal is optional (it may match nothing) if the table's
+    comparison accepts the empty string for it, as with the local and global
+    mods.
+
+    """
+    # Marks the end of the token stream
+    END = None
+
+    SYMBOL_RE = re.compile(r'StackToken\.\w+|"[^"]*"')
+
+    def __init__(self, bnf, table):
+        self.productions = OrderedDict()
+        for line in bnf.strip().splitlines():
+            head, body = line.split("::=")
+            nonterminal = self.__read_symbol(head.strip())
+            self.productions[nonterminal] = [
+                tuple(
+                    symbol for symbol in map(self.__read_symbol, self.SYMBOL_RE.findall(alternative))
+                    if symbol != ""
+                )
+                for alternative in body.split("|")
+            ]
+        self.start = next(iter(self.productions))
+
+        self.terminals = set()
+        for alternatives in self.productions.values():
+            for production in alternatives:
+                self.terminals.update(symbol for symbol in production if symbol not in self.productions)
+        self.optional = frozenset(terminal for terminal in self.terminals if table.compare(terminal, ""))
+
+        self.__compute_first()
+        self.__compute_follow()
+        self.__compute_table()
+
+    @staticmethod
+    def __read_symbol(text):
+        """ Convert a symbol in the BNF to a StackToken or a literal string. """
+        if text.startswith('"'):
+            return text[1:-1]
+        return StackToken[text.split(".", 1)[1]]
+
+    def first_of(self, symbols):
+        """ Return (first, nullable): the set of terminals that can start the
+        sequence of symbols, and whether the sequence can match nothing.
+
+        """
+        first = set()
+        for symbol in symbols:
+            if symbol in self.productions:
+                first |= self.first[symbol]
+                if symbol not in self.nullable:
+                    return (first, False)
+            else:
+                first.add(symbol)
+                if symbol not in self.optional:
+                    return (first, False)
+
+        return (first, True)
+
+    def __compute_first(self):
+        """ Compute the FIRST set and nullability of every nonterminal. """
+        self.first = {nonterminal: set() for nonterminal in self.productions}
+        self.nullable = set()
+        changed = True
+        while changed:
+            changed = False
+            for nonterminal, alternatives in self.productions.items():
+                for production in alternatives:
+                    first, nullable = self.first_of(production)
+                    if not first <= self.first[nonterminal]:
+                        self.first[nonterminal] |= first
+                        changed = True
+                    if nullable and nonterminal not in self.nullable:
+                        self.nullable.add(nonterminal)
+                        changed = True
+
+    def __compute_follow(self):
+        """ Compute the FOLLOW set of every nonterminal. """
+        self.follow = {nonterminal: set() for nonterminal in self.productions}
+        self.follow[self.start].add(self.END)
+        changed = True
+        while changed:
+            changed = False
+            for nonterminal, alternatives in self.productions.items():
+                for production in alternatives:
+                    for i, symbol in enumerate(production):
+                        if symbol not in self.productions:
+                            continue
+                        first, nullable = self.first_of(production[i + 1:])
+                        if nullable:
+                            first |= self.follow[nonterminal]
+                        if not first <= self.follow[symbol]:
+                            self.follow[symbol] |= first
+                            changed = True
+
+    def __compute_table(self):
+        """ Compute the parse table, mapping (nonterminal, terminal) to the
+        production to expand.
+
+        """
+        self.table = {nonterminal: {} for nonterminal in self.productions}
+        for nonterminal, alternatives in self.productions.items():
+            row = self.table[nonterminal]
+            for production in alternatives:
+                first, nullable = self.first_of(production)
+                if nullable:
+                    first |= self.follow[nonterminal]
+                for terminal in first:
+                    if terminal in row and row[terminal] != production:
+                        err = "Grammar is not LL(1): conflict for {} on {!r}".format(nonterminal, terminal)
+                        raise RuntimeError(err)
+                    row[terminal] = production
+
+        # Terminals like StackToken.die_size match a family of tokens, so
+        # they are checked with the comparison functions rather than looked up
+        self.token_class_rows = {
+            nonterminal: [(terminal, production) for terminal, production in row.items() if isinstance(terminal, StackToken)]
+            for nonterminal, row in self.table.items()
+        }
+
+    def select(self, nonterminal, stream_token, table):
+        """ Return the production to expand nonterminal with when the next
+        token is stream_token, or None if there is none.
+
+        """
+        row = self.table[nonterminal]
+        if stream_token is self.END or stream_token in row:
+            return row.get(stream_token)
+
+        for terminal, production in self.token_class_rows[nonterminal]:
+            if table.compare(terminal, stream_token):
+                return production
+
+        return None
+
+
 class LLParser:
-    """ LL Parser. """
+    """ Table driven LL(1) Parser. """
+    # Grammars computed from BNF, by table class
+    grammars = {}
+
     def __init__(self, table, tokenizer):
         self.table = table
-        self.stack = [StackToken.start]
+        self.grammar = self.get_grammar(table)
+        self.stack = [self.grammar.start]
         self.tokenizer = tokenizer
+        self.trace = is_tracing()
         self.__loop()
 
+    @classmethod
+    def get_grammar(cls, table):
+        """ Return the Grammar for BNF with the given table, computing it the
+        first time it is needed.
+
+        """
+        grammar = cls.grammars.get(type(table))
+        if grammar is None:
+            grammar = cls.grammars[type(table)] = Grammar(BNF, table)
+        return grammar
+
     def __loop(self):
         """ Run the LL Parser loop until the stack is empty. """
         # An LL Parser works as follows:
         #
-        # 1. It takes a token from the input stream, until the stream is empty.
-        # 2. It takes an element off the stack.
-        # 3. It compares the token with the stack element.
-        # 4. If the token and the element are the same, then it discards both
-        #    items and repeats from 1. This is when we save the result of the
+        # 1. It takes a token from the input stream, until the stream is
+        #    empty, after which it uses a special end token.
+        # 2. It looks at the element on the top of the stack.
+        # 3. If the element is a nonterminal, it looks up the production for
+        #    that element and token in the parse table, replaces the element
+        #    with the production, and repeats from 2.
+        # 4. If the element is a terminal that matches the token, it discards
+        #    both and repeats from 1. This is when we save the result of the
         #    parsing.
-        # 5. If the stream token and stack element do not match, then it looks
-        #    up an action function in a table indexed by the token and the
-        #    element. It then calls that function, which will often add more
-        #    items to the stack.
-        # 6. The stack element is discarded while the stream token is kept, and
-        #    it repeats at 2.
-
-        logging.info("Beginning loop over tokens.")
+        # 5. If the element is an optional terminal that does not match, it
+        #    discards the element and repeats from 2.
+        # 6. Otherwise, the string does not follow the grammar.
+
+        trace = self.trace
+        grammar = self.grammar
+        table = self.table
+        stack = self.stack
+        productions = grammar.productions
+        optional = grammar.optional
+        saved_value_table = table.saved_value_table
+
+        if trace:
+            logging.info("Beginning loop over tokens.")
         # Step 1. Take a token from the stream
-        for stream_token in self.tokenizer:
-            keep_stream_token = True
-            # Step 2. Get an element from the stack
-            while keep_stream_token and self.stack:
-                logging.debug("Stack is: '%s'", self.stack)
-                stack_element = self.stack.pop()
-                # Step 3. Compare the token and the element
-                logging.debug("Stack element: '%s'; stream element: '%s'", stack_element, stream_token)
-                result = self.table.compare(stack_element, stream_token)
-                # Step 4. If the token and stack are the same, discard both
-                # (and save the result of parsing), and go back to step 1.
-                if result is True:
-                    keep_stream_token = False
+        for stream_token in self.__stream():
+            # Step 2. Look at the top of the stack
+            while stack:
+                if trace:
+                    logging.debug("Stack is: '%s'; stream element: '%s'", stack, stream_token)
+                stack_element = stack[-1]
+                # Step 3. Expand a nonterminal
+                if stack_element in productions:
+                    production = grammar.select(stack_element, stream_token, table)
+                    if production is None:
+                        self.__fail(stream_token)
+                    stack.pop()
+                    stack.extend(reversed(production))
+                # Step 4. Match a terminal and save the result
+                elif stream_token is not Grammar.END and table.compare(stack_element, stream_token):
+                    stack.pop()
                     # We only want to save certain tokens like
                     # 'StackToken.die_num', not others like ')'
                     if isinstance(stack_element, StackToken):
-                        logging.info("Saving value: '%s' = '%s'.", stack_element, stream_token)
-                        self.table.saved_value_table[stack_element] = stream_token
-                    continue
+                        if trace:
+                            logging.info("Saving value: '%s' = '%s'.", stack_element, stream_token)
+                        saved_value_table[stack_element] = stream_token
+                    break
+                # Step 5. Skip an optional terminal
+                elif stack_element in optional:
+                    stack.pop()
+                # Step 6. Error
                 else:
-                    # Step 5. They do not match, so call the action function
-                    self.table.stack_action_table[stack_element](stream_token, self.stack)
-                    # Step 6. Go back to step 2.
-
-        # At this point the stack might not be empty, so check that the rest of
-        # the stack is compatible with an empty stream_token. This happens, for
-        # example, when we do not have global mods or drop mods.
-        if self.stack:
-            logging.debug("Stack not fully consumed, remaining items: %s", self.stack)
-            # TODO: Replace with actual LL Parser check instead of hard-coding. See:
-            # https://github.com/agude/Dice/issues/1
-            if self.stack != [StackToken.drop_mod, StackToken.global_mod] and self.stack != [StackToken.drop_mod]:
-                err = "Stack not fully consumed and remaining items are not compatible with an empty stream: {}".format(self.stack)
-                raise RuntimeError(err)
-            logging.debug("Stack cleared successfully.")
+                    self.__fail(stream_token)
+            else:
+                # The stack is empty, so there must be no tokens left
+                if stream_token is not Grammar.END:
+                    err = "Unexpected token '{}' after the end of the dice format string.".format(stream_token)
+                    raise RuntimeError(err)
+
+    def __stream(self):
+        """ Yield the tokens followed by the end of stream marker. """
+        for stream_token in self.tokenizer:
+            yield stream_token
+        yield Grammar.END
+
+    def __fail(self, stream_token):
+        """ Raise an error for a stream_token that does not fit the grammar. """
+        if stream_token is Grammar.END:
+            err = "Stack not fully consumed and remaining items are not compatible with an empty stream: {}".format(self.stack)
+        else:
+            err = "Unexpected token '{}' in dice format string; stack is: {}".format(stream_token, self.stack)
+        raise RuntimeError(err)
 
 
 class DiceTable:
     """ """
     def __init__(self):
+        self.trace = is_tracing()
         self.comparison_table = {
             StackToken.start: None,
             StackToken.die_type: None,
@@ -164,15 +510,16 @@ class DiceTable:
             StackToken.drop_mod: None,
             StackToken.drop_high: self.__is_str_drop_high,
             StackToken.drop_low: self.__is_str_drop_low,
+            StackToken.die_mod: None,
+            StackToken.reroll: self.__is_reroll,
+            StackToken.explode: self.__is_explode,
+            StackToken.success_mod: None,
+            StackToken.success: self.__is_success,
         }
-        self.stack_action_table = {
-            StackToken.start: self.__start,
-            StackToken.die_type: self.__die_type,
-            # Global mod can be blank, in which case we don't have anything to
-            # add to the stack, but we still need to call a function.
-            StackToken.global_mod: lambda stream_token, strack: False,
-            StackToken.drop_mod: self.__drop_mod,
-        }
+        self.reset()
+
+    def reset(self):
+        """ Forget the saved values, so the table can parse another string. """
         self.saved_value_table = {
             StackToken.die_num: None,
             StackToken.die_size: None,
@@ -180,6 +527,9 @@ class DiceTable:
             StackToken.global_mod: None,
             StackToken.drop_high: None,
             StackToken.drop_low: None,
+            StackToken.reroll: None,
+            StackToken.explode: None,
+            StackToken.success: None,
         }
 
     def compare(self, token_string, stream_token):
@@ -208,111 +558,21 @@ class DiceTable:
         """
         # If a is a single character, then the comparison is just equality
         if not isinstance(token_string, StackToken):
-            logging.debug("Comparing: '%s' to '%s' with '=='", token_string, stream_token)
+            if self.trace:
+                logging.debug("Comparing: '%s' to '%s' with '=='", token_string, stream_token)
             return token_string == stream_token
 
         # Otherwise get the comparison function for the 'a' object and use it
         comp_function = self.comparison_table[token_string]
         if comp_function is None:
-            logging.debug("Comp function is 'None' for: '%s' to '%s'", token_string, stream_token)
+            if self.trace:
+                logging.debug("Comp function is 'None' for: '%s' to '%s'", token_string, stream_token)
             return False
 
-        logging.debug("Comparing: '%s' to '%s' with '%s'", token_string, stream_token, comp_function)
+        if self.trace:
+            logging.debug("Comparing: '%s' to '%s' with '%s'", token_string, stream_token, comp_function)
         return comp_function(stream_token)
 
-    def __start(self, stream_token, stack):
-        """ Take action when stack status is StackToken.start.
-
-        Replaces the StackToken.start token with the four parts of a dice
-        format string:
-
-            StackToken.die_num StackToken.die_type StackToken.global_mod StackToken.drop_mod
-
-        Args:
-            stream_token (str): The token from the stream, although it is ignored.
-            stack (list): The stack of `token_string`s, which we may modify by
-                pushing more `token_string`s onto.
-
-        Returns:
-            True: No matching is required, so always returns true.
-
-        """
-        # Reversed() is used because we use a stack, so the first item to test
-        # is the last item on the stack. However, it is easier for the author
-        # to think left to right.
-        stack += reversed([StackToken.die_num, StackToken.die_type, StackToken.global_mod, StackToken.drop_mod])
-        return True
-
-    def __die_type(self, stream_token, stack):
-        """ Take action when stack status is StackToken.die_type.
-
-        Die type can lead down two paths, depending on the `stream_token`. If
-        the `stream_token` is '(', then we might be starting a die type with
-        local mod:
-
-            ( StackToken.die_size StackToken.local_mod )
-
-        Otherwise, if our token starts with 'd', it is just the die size:
-
-            StackToken.die_size
-
-        Args:
-            stream_token (str): The token from the stream.
-            stack (list): The stack of `token_string`s, which we may modify by
-                pushing more `token_string`s onto.
-
-        Returns:
-            bool: True if we successfully matched an action to the
-                `stream_token`, False otherwise.
-
-        """
-        # If we found a parenthesis, then we might have a local mod
-        if stream_token == '(':
-            stack += reversed(["(", StackToken.die_size, StackToken.local_mod, ")"])
-            return True
-        # Otherwise it is just a normal die size
-        elif stream_token[0] == 'd':
-            stack.append(StackToken.die_size)
-            return True
-
-        return False
-
-    def __drop_mod(self, stream_token, stack):
-        """ Take action when stack status is StackToken.drop_mod.
-
-        Drop mod is nothing if `stream_token` is empty, or it can by a drop mod
-        low followed by another drop mod if the `stream_token` ends in 'L', or
-        a drop mod high followed by another drop mod if `stream_token` ends in
-        'H', as follows:
-
-            StackToken.drop_low StackToken.drop_mod | StackToken.drop_high StackToken.drop_mod
-
-        Args:
-            stream_token (str): The token from the stream.
-            stack (list): The stack of `token_string`s, which we may modify by
-                pushing more `token_string`s onto.
-
-        Returns:
-            bool: True if we successfully matched an action to the
-                `stream_token`, False otherwise.
-
-        """
-        # Drop can be blank
-        if stream_token == '':
-            return True
-        # Or it can be a drop mod
-        elif stream_token[0] == '-':
-            # either low
-            if stream_token[-1] in ['L', 'l']:
-                stack += reversed([StackToken.drop_low, StackToken.drop_mod])
-                return True
-            # or high
-            elif stream_token[-1] in ['H', 'h']:
-                stack += reversed([StackToken.drop_high, StackToken.drop_mod])
-                return True
-
-        return False
-
     def __is_str_die_size(self, stream_token):
         """ Check if s matches StackToken.die_size.
 
@@ -325,11 +585,11 @@ class DiceTable:
 
         """
         # Must have a "d" as the first part of the token
-        if not stream_token[0] == 'd':
+        if not stream_token[:1] == 'd':
             return False
         # Must then be followed by an integer or an F for fate dice
         is_int = stream_token[1:].isdecimal()
-        if not is_int and stream_token[1] != 'F':
+        if not is_int and stream_token[1:] != 'F':
             return False
 
         return True
@@ -351,9 +611,9 @@ class DiceTable:
         # A drop mod has three pieces:
         #
         # It starts with a -
-        has_minus = stream_token[0] == '-'
+        has_minus = stream_token[:1] == '-'
         # It ends with a specific character
-        has_char = stream_token[-1] in chars
+        has_char = stream_token[-1:] in chars
         # And the middle is an integer or empty
         mid = stream_token[1:-1]
         ok_mid = mid == '' or mid.isdecimal()
@@ -392,178 +652,2616 @@ class DiceTable:
         """ Check if stream_token matches StackToken.die_num """
         return stream_token.isdecimal()
 
+    def __is_reroll(self, stream_token):
+        """ Check if stream_token matches StackToken.reroll, like 'r1' """
+        return stream_token[:1] == 'r' and stream_token[1:].isdecimal()
+
+    def __is_explode(self, stream_token):
+        """ Check if stream_token matches StackToken.explode, like '!' or '!3' """
+        # The explosion cap is optional
+        cap = stream_token[1:]
+        return stream_token[:1] == '!' and (cap == '' or cap.isdecimal())
+
+    def __is_success(self, stream_token):
+        """ Check if stream_token matches StackToken.success, like '>=8' """
+        comparison = stream_token.rstrip('0123456789')
+        target = stream_token[len(comparison):]
+        return comparison in COMPARISONS and target.isdecimal()
+
 BNF = """
-StackToken.dice_notation ::= StackToken.die_num StackToken.die_type StackToken.global_mod StackToken.drop_mod
-StackToken.die_type ::= StackToken.die_size | "(" StackToken.die_size StackToken.local_mod ")"
+StackToken.start ::= StackToken.die_num StackToken.die_type StackToken.global_mod StackToken.drop_mod StackToken.success_mod
+StackToken.die_type ::= StackToken.die_size StackToken.die_mod | "(" StackToken.die_size StackToken.die_mod StackToken.local_mod ")"
+StackToken.die_mod ::= StackToken.reroll StackToken.die_mod | StackToken.explode StackToken.die_mod | ""
 StackToken.drop_mod ::= StackToken.drop_high StackToken.drop_mod | StackToken.drop_low StackToken.drop_mod | ""
+StackToken.success_mod ::= StackToken.success | ""
 """
 
 
-#Dice
-class Dice:
-    """ A class to roll dice based on a dice format string. """
-
-    def __init__(self, dice_str, parser=LLParser, tokenizer=DiceTokenizer, table=DiceTable):
-        """ Sets up the dice by parsing a string of its type: 3d5 """
-        self.dice_str = dice_str
-        self.table = table()
-        self.tokenizer = tokenizer(self.dice_str)
-        self.parser = parser(self.table, self.tokenizer)
-        self.saved_value_table = self.table.saved_value_table
-
-        logging.debug("Saved values: %s", self.saved_value_table)
-
-        self.number = int(self.saved_value_table[StackToken.die_num])
-        die_size = self.saved_value_table[StackToken.die_size][1:]
-        if die_size == "F":
-            self.size = die_size
+class RandomStream:
+    """ A source of random numbers backed by the standard library.
+
+    Wraps a `random.Random` instance (or the `random` module itself) in the
+    same bulk interface as a NumPy `Generator`, so the dice can draw all the
+    values they need in one call.
+
+    """
+    def __init__(self, seed=None, generator=None):
+        """ Create a stream from a seed, or around an existing generator.
+
+        Args:
+            seed: Seed for a new `random.Random`; ignored if `generator` is
+                given.
+            generator: A `random.Random` instance or the `random` module.
+
+        """
+        self.generator = generator if generator is not None else random.Random(seed)
+
+    def integers(self, low, high, size=None):
+        """ Return random integers from low (inclusive) to high (exclusive).
+
+        Args:
+            low (int): The lowest value.
+            high (int): One more than the highest value.
+            size (int or tuple): The number of values to return as a list,
+                or a (rows, columns) tuple to return a list of lists. If
+                None, a single int is returned.
+
+        """
+        if size is None:
+            return self.generator.randrange(low, high)
+
+        # The same draws as random.choices(range(low, high), k=size), which
+        # is only in Python 3.6 and later
+        uniform = self.generator.random
+        span = float(high - low)
+        if isinstance(size, tuple):
+            rows, columns = size
+            return [[low + int(uniform() * span) for _ in range(columns)] for _ in range(rows)]
+
+        return [low + int(uniform() * span) for _ in range(size)]
+
+    def random(self):
+        """ Return a float uniformly distributed in [0, 1). """
+        return self.generator.random()
+
+    def spawn(self, n):
+        """ Return n new, independently seeded streams. """
+        return [RandomStream(self.generator.getrandbits(128)) for _ in range(n)]
+
+
+# Used when no random number generator is given, so that seeding the random
+# module still makes rolls reproducible.
+GLOBAL_STREAM = RandomStream(generator=random)
+
+
+class ThreadLocalStream:
+    """ A source of random numbers that gives every thread its own
+    RandomStream.
+
+    Threads never share generator state, so they can roll at the same time
+    without contending for the global `random` module. Each thread's stream
+    is made the first time that thread draws a number.
+
+    """
+    def __init__(self, seed=None):
+        """ Args:
+            seed: If given, the thread streams are seeded from a stream with
+                this seed, in the order the threads first draw; otherwise each
+                is seeded by the operating system. For streams that are
+                reproducible per worker, hand each worker one of
+                `spawn_rngs()` instead.
+
+        """
+        self.__local = threading.local()
+        self.__seeds = None if seed is None else RandomStream(seed)
+        self.__lock = threading.Lock()
+
+    def stream(self):
+        """ Return the RandomStream of the calling thread. """
+        try:
+            return self.__local.stream
+        except AttributeError:
+            pass
+
+        if self.__seeds is None:
+            stream = RandomStream()
         else:
-            self.size = int(die_size)
+            # Only taken once per thread, when its stream is made
+            with self.__lock:
+                stream = self.__seeds.spawn(1)[0]
+        self.__local.stream = stream
+        return stream
 
-        self.local_mod = self.__get_die_mod(StackToken.local_mod)
-        self.global_mod = self.__get_die_mod(StackToken.global_mod)
-        self.highest_mod = self.__get_drop_mod(StackToken.drop_high)
-        self.lowest_mod = self.__get_drop_mod(StackToken.drop_low)
+    def integers(self, low, high, size=None):
+        """ Return random integers from the calling thread's stream; see
+        `RandomStream.integers()`.
 
-        # If we have a global mod, we must sum all the dice to apply it
-        self.do_sum = bool(self.global_mod)
-        if self.do_sum:
-            logging.info("Turning on summing as required by presence of a global mod.")
+        """
+        return self.stream().integers(low, high, size)
 
-        # Error checking to make sure the above values lead to valid
-        # combinations of dice.
-        self.__do_error_checking()
+    def random(self):
+        """ Return a float uniformly distributed in [0, 1) from the calling
+        thread's stream.
 
-    def __do_error_checking(self):
-        # If we are rolling 0 (or fewer) dice
-        if self.number < 1:
-            err = "Number of dice {} is less than 1.".format(self.number)
-            raise ValueError(err)
+        """
+        return self.stream().random()
 
-        # If the die size is less than 2, then there are no interesting results
-        if self.size != "F" and self.size < 2:
-            err = "Die size of {} is less than 2.".format(self.size)
-            raise ValueError(err)
+    def spawn(self, n):
+        """ Return n new, independently seeded streams. """
+        return self.stream().spawn(n)
 
-        # If we have zero (or fewer) dice left after dropping
-        if self.highest_mod + self.lowest_mod >= self.number:
-            dropped = self.highest_mod + self.lowest_mod
-            err = "Number of dice dropped ({}) greater than or equal to number rolled ({}).".format(dropped, self.number)
-            raise ValueError(err)
 
-        # If the local mod is too large, all rolls will be 0
-        # (but Fate dice are allowed to go negative, so we ignore in that case)
-        if self.size != "F" and self.size + self.local_mod <= 0:
-            err = "Local mod {} is larger than die size {}; all rolls would be 0!".format(self.local_mod, self.size)
-            raise ValueError(err)
+# Used for rng="thread"
+THREAD_STREAM = ThreadLocalStream()
 
-    def __get_die_mod(self, mod_str):
-        """ Get general die mod """
-        mod = self.saved_value_table.get(mod_str, None)
-        if mod is None:
-            return 0
 
-        return int(mod)
+def as_rng(source=None):
+    """ Return a random number generator with an `integers(low, high, size)`
+    method for the given source.
 
-    def __get_drop_mod(self, mod_str):
-        """ Get general drop mod """
-        mod = self.saved_value_table[mod_str]
+    Args:
+        source: None for the global stream, "thread" for a separate stream in
+            each thread, an int seed, a `random.Random` instance, a NumPy
+            `Generator`, or any object with an `integers()` method. A
+            `random()` method returning a float in [0, 1) is optional; alias
+            sampling uses it when it is there.
 
-        # No modifier
-        if mod is None:
-            return 0
+    """
+    if source is None:
+        return GLOBAL_STREAM
+    if source == "thread":
+        return THREAD_STREAM
+    if isinstance(source, int):
+        return RandomStream(source)
+    if isinstance(source, random.Random):
+        return RandomStream(generator=source)
+    if hasattr(source, "integers"):
+        return source
 
-        # See if the modifier is just a switch like -H,
-        # or has a number like -2H
-        mod = mod[1:]  # Drop -
-        mod = mod.rstrip('HhLl')
-        if mod:
-            return int(mod)
+    err = "Can not use {!r} as a random number generator.".format(source)
+    raise TypeError(err)
 
-        # No number, so modifier is 1
-        return 1
 
-    def roll(self, do_sum=False):
-        """ Roll the dice and print the result. """
-        logging.info("Rolling dice")
-        # Generate rolls
-        values = []
-        for _ in range(0, self.number):
-            # Fate Dice use F, and have sides (-1, 0, 1)
-            if self.size == "F":
-                rand_val = randint(-1, 1)
-                die_val = rand_val + self.local_mod
-                logging.debug("Roll value is %i = %i%i", die_val, rand_val, self.local_mod)
-            else:
-                rand_val = randint(1, self.size)
-                die_val = rand_val + self.local_mod
-                logging.debug("Roll value is %i = %i%i", die_val, rand_val, self.local_mod)
+def spawn_rngs(source, n):
+    """ Return n independent random number generators derived from source,
+    for example one for each parallel worker.
 
-                die_val = max(die_val, 0)  # Dice must roll at least 0 after mods
-                logging.debug("Roll value is '%i' after max()", die_val)
+    NumPy Generators are split with their SeedSequence; other sources must
+    provide a `spawn(n)` method.
 
-            values.append(die_val)
+    """
+    rng = as_rng(source)
+    numpy = _numpy()
+    if numpy is not None and isinstance(rng, numpy.random.Generator):
+        # Generator.spawn() is only in NumPy 1.25 and later, and seed_seq was
+        # private before then
+        bit_generator = rng.bit_generator
+        seed_seq = getattr(bit_generator, "seed_seq", None) or bit_generator._seed_seq
+        return [numpy.random.Generator(type(bit_generator)(seed)) for seed in seed_seq.spawn(n)]
 
-        # Remove highest and lowest dice
-        if self.lowest_mod >= 1 or self.highest_mod >= 1:
-            logging.info("Dropping High/Low dice.")
-            start_i = self.lowest_mod
-            end_i = len(values) - self.highest_mod
-            sorted_values = sorted(values)
+    spawn = getattr(rng, "spawn", None)
+    if spawn is None:
+        err = "Random number generator {!r} can not spawn new streams.".format(rng)
+        raise TypeError(err)
 
-            logging.debug("Sorted dice values pre-dropping: %s", sorted_values)
-            low_dice = sorted_values[:start_i]
-            if low_dice:
-                logging.debug("Dropping low dice: %s", low_dice)
+    return spawn(n)
 
-            high_dice = sorted_values[end_i:]
-            if high_dice:
-                logging.debug("Dropping low dice: %s", high_dice)
 
-            values = sorted_values[start_i:end_i]
+def _default_numpy_rng():
+    """ Return the NumPy Generator used when no generator is given. """
+    global _NUMPY_RNG
+    if _NUMPY_RNG is None:
+        _NUMPY_RNG = _numpy().random.default_rng()
+    return _NUMPY_RNG
 
-        logging.debug("Final die values: %s", values)
 
-        #Return values
-        if self.do_sum or do_sum:
-            logging.info("Summing dice.")
-            output = sum(values) + self.global_mod
+_NUMPY_RNG = None
+
+
+def _as_list(values):
+    """ Return the values drawn by a generator as a list of ints. """
+    tolist = getattr(values, "tolist", None)
+    if tolist is not None:
+        return tolist()
+    return list(values)
+
+
+class Distribution:
+    """ The exact probability mass function of a summed roll.
+
+    The probabilities are stored densely: `probabilities[i]` is the
+    probability of rolling a total of `minimum + i`. They are kept as a
+    tuple, or as the given memoryview of doubles so that a distribution read
+    from a `DistributionStore` is never copied.
+
+    """
+    def __init__(self, minimum, probabilities):
+        self.minimum = minimum
+        if isinstance(probabilities, memoryview):
+            self.probabilities = probabilities
         else:
-            output = values
+            self.probabilities = tuple(probabilities)
+        self.maximum = minimum + len(self.probabilities) - 1
+        self.__cumulative = None
+        self.__mean = None
 
-        logging.debug("Final results: %s", output)
-        return output
+    def __len__(self):
+        return len(self.probabilities)
 
+    def __repr__(self):
+        return "Distribution(minimum={!r}, maximum={!r})".format(self.minimum, self.maximum)
 
-def main():
-    # Command line parsing
-    parser = argparse.ArgumentParser(
-        prog="Dice",
-        description="A very complicated way of rolling dice.",
-    )
-    parser.add_argument("-v", "--version", action="version", version="%(prog)s 4.1.0")
-    parser.add_argument("dice_notation", type=str, help="the dice notation for the dice to roll, such as '4d6'")
-    parser.add_argument("-s", "--sum", help="sum the results of the roll", action="store_true", default=False)
-    parser.add_argument(
-        "--log",
-        help="set the logging level, defaults to WARNING",
-        dest="log_level",
-        default=logging.WARNING,
-        choices=[
-            'DEBUG',
-            'INFO',
-            'WARNING',
-            'ERROR',
-            'CRITICAL',
-        ],
-    )
+    def shift(self, amount):
+        """ Return a new Distribution with every total moved by amount. """
+        return Distribution(self.minimum + amount, self.probabilities)
 
-    args = parser.parse_args()
+    def negate(self):
+        """ Return the Distribution of minus the total. """
+        return Distribution(-self.maximum, reversed(self.probabilities))
 
-    # Set the logging level based on the arguments
-    logging.basicConfig(level=args.log_level)
+    def add(self, other):
+        """ Return the Distribution of the sum of this total and an
+        independent total drawn from other.
 
-    logging.debug("Arguments: %s", args)
+        """
+        numpy = _numpy()
+        if numpy is not None:
+            probabilities = numpy.convolve(self.probabilities, other.probabilities).tolist()
+        else:
+            probabilities = _convolve(self.probabilities, other.probabilities)
+        return Distribution(self.minimum + other.minimum, probabilities)
+
+    def pmf(self):
+        """ Return the distribution as a dictionary of total: probability. """
+        return {self.minimum + i: p for i, p in enumerate(self.probabilities) if p}
+
+    def probability(self, total):
+        """ Return the probability of rolling exactly total. """
+        i = total - self.minimum
+        if 0 <= i < len(self.probabilities):
+            return self.probabilities[i]
+        return 0.
+
+    def cumulative(self):
+        """ Return a tuple of P(X <= minimum + i) for each i. """
+        if self.__cumulative is None:
+            running = 0.
+            cumulative = []
+            for p in self.probabilities:
+                running += p
+                cumulative.append(running)
+            self.__cumulative = tuple(cumulative)
+        return self.__cumulative
+
+    def at_most(self, total):
+        """ Return P(X <= total). """
+        i = total - self.minimum
+        if i < 0:
+            return 0.
+        if i >= len(self.probabilities):
+            return 1.
+        return min(self.cumulative()[i], 1.)
+
+    def at_least(self, total):
+        """ Return P(X >= total). """
+        return max(1. - self.at_most(total - 1), 0.)
+
+    def mean(self):
+        """ Return the expected total. """
+        if self.__mean is None:
+            self.__mean = self.minimum + sum(i * p for i, p in enumerate(self.probabilities))
+        return self.__mean
+
+    def variance(self):
+        """ Return the variance of the total. """
+        offset = self.mean() - self.minimum
+        return sum((i - offset) ** 2 * p for i, p in enumerate(self.probabilities))
+
+    def percentile(self, q):
+        """ Return the smallest total t such that P(X <= t) >= q / 100. """
+        if not 0 <= q <= 100:
+            err = "Percentile {} is not between 0 and 100.".format(q)
+            raise ValueError(err)
+        cumulative = self.cumulative()
+        # Allow for the rounding error accumulated in the running sum
+        i = bisect_left(cumulative, q / 100. - 1e-12)
+        return self.minimum + min(i, len(cumulative) - 1)
+
+
+# Summed rolls of more dice than this are drawn in chunks of this size by
+# `RollPlan.stream_sum()`
+STREAM_CHUNK_SIZE = 1024
+
+# The number of extra rolls an exploding die ('d6!') may make, unless the
+# string sets its own cap ('d6!3'). Capping the explosions bounds the cost of
+# a roll.
+EXPLODE_CAP = 20
+MAX_EXPLODE_CAP = 100
+
+# The comparisons allowed when counting successes, like '10d10>=8'
+COMPARISONS = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+    "=": operator.eq,
+}
+
+
+def _die_runs(size, reroll=0, explode=0):
+    """ Return the values a single die can roll, before its local mod, as a
+    list of (low, high, probability) runs of consecutive values that each
+    have the same chance; see `_die_faces()`. There is one run for each
+    number of extra rolls of an exploding die.
+
+    """
+    if size == "F":
+        return [(-1, 1, 1. / 3.)]
+
+    p = 1. / (size - reroll)
+    if not explode:
+        return [(reroll + 1, size, p)]
+
+    q = 1. / size
+    runs = [(reroll + 1, size - 1, p)]
+    for extra in range(1, explode + 1):
+        last_face = size if extra == explode else size - 1
+        runs.append((size * extra + 1, size * extra + last_face, p * q ** extra))
+    return runs
+
+
+@lru_cache(maxsize=256)
+def _die_faces(size, local_mod, reroll=0, explode=0):
+    """ Return the values a single die can roll as a sorted tuple of (value,
+    probability) pairs.
+
+    Faces at or below reroll are rerolled until they are not, so the first
+    roll is uniform over the faces above it. An exploding die that shows its
+    highest face is rolled again and added, up to explode extra rolls. After
+    j extra rolls the value is size * j + r; the chance of each such value is
+    p * (1 / size)**j, where p is the chance of one face on the first roll,
+    and on the last allowed roll r may also be size. The local mod is then
+    applied to each value, and non-Fate dice are clamped at 0, exactly as in
+    `RollPlan.roll()`.
+
+    """
+    faces = []
+    for low, high, p in _die_runs(size, reroll, explode):
+        # The rest of the tail is too unlikely to be a float
+        if not p:
+            break
+        faces.extend((value, p) for value in range(low, high + 1))
+
+    merged = {}
+    for value, p in faces:
+        value += local_mod
+        if size != "F":
+            value = max(value, 0)  # Dice must roll at least 0 after mods
+        merged[value] = merged.get(value, 0.) + p
+
+    return tuple(sorted(merged.items()))
+
+
+def _score(value, success):
+    """ Return what a kept die adds to the total: its value, or 1 if it is a
+    success and 0 if not when counting successes.
+
+    """
+    if success is None:
+        return value
+    comparison, target = success
+    return 1 if COMPARISONS[comparison](value, target) else 0
+
+
+def _die_value_range(size, local_mod, reroll=0, explode=0):
+    """ Return the (minimum, maximum) value of a single die after its local
+    mod, from its parameters alone; see `_die_faces()`.
+
+    """
+    if size == "F":
+        return (local_mod - 1, local_mod + 1)
+
+    # A die that always shows its highest face explodes at least once
+    lowest = reroll + 1 if reroll + 1 < size or not explode else size + 1
+    highest = size * (explode + 1)
+    return (max(lowest + local_mod, 0), max(highest + local_mod, 0))
+
+
+def _die_rolls(value, size, local_mod, reroll=0, explode=0):
+    """ Return True if a single die can show value after its local mod. """
+    lowest, highest = _die_value_range(size, local_mod, reroll, explode)
+    if not lowest <= value <= highest:
+        return False
+    if size == "F" or value == lowest:
+        return True
+
+    # The value before the mod and the clamp. An exploding die never stops on
+    # its highest face, except on its last allowed roll.
+    value -= local_mod
+    if not explode or value < size:
+        return value > reroll
+    return value == size * (explode + 1) or value % size != 0
+
+
+@lru_cache(maxsize=256)
+def _die_range(size, local_mod, reroll=0, explode=0, success=None):
+    """ Return the (minimum, maximum) that a single die adds to the total,
+    without listing its faces.
+
+    """
+    lowest, highest = _die_value_range(size, local_mod, reroll, explode)
+    if success is None:
+        return (lowest, highest)
+
+    comparison, target = success
+    if comparison == "=":
+        can_succeed = _die_rolls(target, size, local_mod, reroll, explode)
+        can_fail = lowest != highest or lowest != target
+        return (0 if can_fail else 1, 1 if can_succeed else 0)
+
+    # The other comparisons are monotonic, so the extreme values decide
+    scores = (_score(lowest, success), _score(highest, success))
+    return (min(scores), max(scores))
+
+
+@lru_cache(maxsize=256)
+def _die_distribution(size, local_mod, reroll=0, explode=0, success=None):
+    """ Return the distribution of what a single die adds to the total as
+    (minimum, probabilities).
+
+    """
+    scores = [(_score(value, success), p) for value, p in _die_faces(size, local_mod, reroll, explode)]
+
+    # The range, rather than the faces, sets the length, so that it matches
+    # `RollPlan.total_count()` even when the far end of an explosion tail is
+    # too unlikely to be listed
+    minimum, maximum = _die_range(size, local_mod, reroll, explode, success)
+    probabilities = [0.] * (maximum - minimum + 1)
+    for score, p in scores:
+        probabilities[score - minimum] += p
+
+    return (minimum, tuple(probabilities))
+
+
+def _convolve(a, b):
+    """ Return the convolution of two lists of probabilities. """
+    output = [0.] * (len(a) + len(b) - 1)
+    for i, p_a in enumerate(a):
+        if not p_a:
+            continue
+        for j, p_b in enumerate(b):
+            output[i + j] += p_a * p_b
+
+    return output
+
+
+def _power_direct(probabilities, number):
+    """ Return the distribution of the sum of number dice by convolving in
+    one die at a time.
+
+    Cost is O(number**2 * size**2).
+
+    """
+    output = probabilities
+    for _ in range(number - 1):
+        output = _convolve(output, probabilities)
+
+    return output
+
+
+def _power_squaring(probabilities, number):
+    """ Return the distribution of the sum of number dice by exponentiation
+    by squaring of the single die polynomial.
+
+    Only O(log(number)) convolutions are needed, although the last ones are
+    of the longest lists.
+
+    """
+    output = None
+    square = list(probabilities)
+    while number:
+        if number & 1:
+            output = square if output is None else _convolve(output, square)
+        number >>= 1
+        if number:
+            square = _convolve(square, square)
+
+    return output
+
+
+def _power_fft(probabilities, number):
+    """ Return the distribution of the sum of number dice with a single real
+    FFT: the transform of the die is raised to the power number and then
+    inverted.
+
+    Cost is O(L log L) where L = number * (len(probabilities) - 1) + 1 is the
+    length of the output.
+
+    Error bound: each transformed coefficient has magnitude at most 1 and a
+    relative error of about log2(L) * eps (eps = 2.2e-16). Raising it to the
+    power number multiplies that error by at most number, so every returned
+    probability has an absolute error below roughly number * log2(L) * eps;
+    about 2e-11 for 5000d6. Probabilities smaller than that (far in the
+    tails) are not meaningful, and any negative values from rounding are
+    clipped to 0.
+
+    """
+    numpy = _numpy()
+    if numpy is None:
+        raise ImportError("The 'fft' convolution backend requires NumPy.")
+
+    length = number * (len(probabilities) - 1) + 1
+    fft_length = 1 << (length - 1).bit_length()
+    transform = numpy.fft.rfft(probabilities, fft_length)
+    output = numpy.fft.irfft(transform ** number, fft_length)[:length]
+    numpy.clip(output, 0., None, out=output)
+
+    return output.tolist()
+
+
+# Methods of computing the distribution of the sum of a pool of identical dice
+CONVOLUTION_BACKENDS = {
+    "direct": _power_direct,
+    "squaring": _power_squaring,
+    "fft": _power_fft,
+}
+
+# Pools with more possible totals than this use the FFT backend if NumPy is
+# installed
+FFT_MIN_LENGTH = 512
+# Pools with at least this many dice use exponentiation by squaring
+SQUARING_MIN_NUMBER = 8
+
+
+def _choose_backend(number, size):
+    """ Return the name of the fastest suitable convolution backend for a pool
+    of number dice of the given size.
+
+    """
+    faces = 3 if size == "F" else size
+    if number * (faces - 1) + 1 >= FFT_MIN_LENGTH and _numpy() is not None:
+        return "fft"
+    if number >= SQUARING_MIN_NUMBER:
+        return "squaring"
+    return "direct"
+
+
+@lru_cache(maxsize=256)
+def _pool_distribution(number, size, local_mod, backend, reroll=0, explode=0, success=None):
+    """ Return the distribution of the sum of number dice as (minimum,
+    probabilities), using the named convolution backend.
+
+    """
+    die_minimum, die_probabilities = _die_distribution(size, local_mod, reroll, explode, success)
+    probabilities = CONVOLUTION_BACKENDS[backend](die_probabilities, number)
+
+    return (number * die_minimum, tuple(probabilities))
+
+
+def _binomial_pmf(trials, p):
+    """ Return the list of P(k successes) for k = 0..trials. """
+    if p >= 1.:
+        return [0.] * trials + [1.]
+    if p <= 0.:
+        return [1.] + [0.] * trials
+
+    # Work in log space so that large pools do not underflow
+    log_p = math.log(p)
+    log_q = math.log1p(-p)
+    log_n = math.lgamma(trials + 1)
+    return [
+        math.exp(log_n - math.lgamma(k + 1) - math.lgamma(trials - k + 1) + k * log_p + (trials - k) * log_q)
+        for k in range(trials + 1)
+    ]
+
+
+def _add_shifted(target, source, shift, weight):
+    """ Add weight * source into target, starting at index shift. """
+    end = shift + len(source)
+    if len(target) < end:
+        target.extend([0.] * (end - len(target)))
+    for i, p in enumerate(source, shift):
+        target[i] += weight * p
+
+
+@lru_cache(maxsize=256)
+def _drop_distribution(number, size, local_mod, highest_mod, lowest_mod, reroll=0, explode=0, success=None):
+    """ Return the distribution of the sum of the dice kept after dropping the
+    highest_mod highest and lowest_mod lowest dice as (minimum,
+    probabilities).
+
+    Rather than enumerating all outcomes, this walks the faces from lowest to
+    highest, keeping track of how many dice have been assigned so far and the
+    distribution of the sum of the kept dice. When there are k dice assigned
+    and m = number - k remaining, the number of the remaining dice that show
+    the current face (given that they show this face or higher) is binomial.
+    Dice at sorted positions [lowest_mod, number - highest_mod) are kept,
+    and each kept die adds its score (see `_score()`) to the sum.
+
+    """
+    die_faces = _die_faces(size, local_mod, reroll, explode)
+    die_minimum = min(_score(value, success) for value, _ in die_faces)
+    faces = [(_score(value, success) - die_minimum, p) for value, p in die_faces]
+
+    keep_start = lowest_mod
+    keep_end = number - highest_mod
+
+    # states[k] is the distribution of the kept sum (relative to the lowest
+    # face) with k dice assigned so far.
+    # tails[i] is the chance of rolling face i or higher. Summing from the
+    # top keeps the tiny tails of exploding dice accurate.
+    tails = [0.] * len(faces)
+    remaining = 0.
+    for face_i in reversed(range(len(faces))):
+        remaining += faces[face_i][1]
+        tails[face_i] = remaining
+
+    states = {0: [1.]}
+    finished = []
+    for face_i, (value, p) in enumerate(faces):
+        if face_i == len(faces) - 1:
+            q = 1.
+        elif not tails[face_i]:
+            q = 0.  # No dice are left to land on this face
+        else:
+            q = min(p / tails[face_i], 1.)
+
+        new_states = {}
+        for k, kept_sum in states.items():
+            binomial = _binomial_pmf(number - k, q)
+            for count, weight in enumerate(binomial):
+                if not weight:
+                    continue
+                new_k = k + count
+                kept = max(0, min(new_k, keep_end) - max(k, keep_start))
+                # Once the kept positions are filled, the rest of the dice are
+                # dropped and cannot change the sum.
+                if new_k >= keep_end:
+                    _add_shifted(finished, kept_sum, kept * value, weight)
+                else:
+                    target = new_states.setdefault(new_k, [])
+                    _add_shifted(target, kept_sum, kept * value, weight)
+        states = new_states
+
+    minimum = (keep_end - keep_start) * die_minimum
+    return (minimum, tuple(finished))
+
+
+class AliasTable:
+    """ Draws totals from a Distribution in constant time with Walker's alias
+    method.
+
+    Building the table is O(len(distribution)); each draw then costs a single
+    call to the random number generator. The draw is exact up to floating
+    point resolution.
+
+    """
+    def __init__(self, distribution):
+        self.minimum = distribution.minimum
+        length = len(distribution)
+        scaled = [p * length for p in distribution.probabilities]
+        # Compact arrays of 8 byte doubles and integers, rather than lists
+        # of Python objects
+        self.threshold = array("d", [1.]) * length
+        self.alias = array("l", range(length))
+
+        # Vose's algorithm: pair each under-full column with an over-full one
+        small = [i for i, p in enumerate(scaled) if p < 1.]
+        large = [i for i, p in enumerate(scaled) if p >= 1.]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self.threshold[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] = (scaled[more] + scaled[less]) - 1.
+            if scaled[more] < 1.:
+                small.append(more)
+            else:
+                large.append(more)
+        # Whatever is left is full up to rounding error, so it keeps the
+        # default threshold of 1.
+
+    def __len__(self):
+        return len(self.threshold)
+
+    def sample(self, rng=None):
+        """ Draw a total.
+
+        Args:
+            rng: A random number generator source accepted by `as_rng()`.
+
+        """
+        rng = as_rng(rng)
+        uniform = getattr(rng, "random", None)
+        if uniform is not None:
+            # Split one uniform draw into the column and the coin flip
+            x = uniform() * len(self.threshold)
+            i = int(x)
+            coin = x - i
+        else:
+            # Generators with only integers() draw the two separately
+            i = int(rng.integers(0, len(self.threshold)))
+            coin = int(rng.integers(0, 1 << 53)) / float(1 << 53)
+
+        if coin < self.threshold[i]:
+            return self.minimum + i
+        return self.minimum + self.alias[i]
+
+
+# The largest alias table (in number of possible totals) that a RollPlan will
+# build; larger pools fall back to rolling each die.
+MAX_ALIAS_TABLE_SIZE = 1 << 20
+
+# The largest estimated cost (see `_drop_distribution_cost()`) of the exact
+# distribution of a pool with drop mods that sample_sum() will pay for; about
+# a quarter of a second. Costlier pools fall back to rolling each die.
+MAX_DROP_DISTRIBUTION_COST = 5 * 10 ** 7
+
+# The largest estimated cost of the exact distribution of a pool with drop
+# mods that distribution() will compute at all; a few seconds. Long explosion
+# tails make pools like '50d6!-L' far costlier than this.
+MAX_EXACT_DROP_COST = 5 * 10 ** 8
+
+
+class AliasTableCache:
+    """ A thread-safe, least-recently-used cache of alias tables, bounded by
+    the total number of entries in all the tables it holds rather than by
+    the number of tables.
+
+    """
+    def __init__(self, max_entries=1 << 22):
+        if max_entries < 1:
+            err = "Cache size {} is less than 1.".format(max_entries)
+            raise ValueError(err)
+        self.max_entries = max_entries
+        self.entries = 0
+        self.__tables = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__tables)
+
+    def table(self, plan):
+        """ Return the AliasTable for plan, building it if it is not cached.
+
+        A table larger than the whole cache is built but not kept.
+
+        """
+        with self.__lock:
+            table = self.__tables.get(plan)
+            if table is not None:
+                self.__tables.move_to_end(plan)
+                return table
+
+        # Build outside the lock, so other plans can be sampled meanwhile
+        table = AliasTable(plan.distribution())
+        if len(table) > self.max_entries:
+            return table
+
+        with self.__lock:
+            if plan not in self.__tables:
+                self.__tables[plan] = table
+                self.entries += len(table)
+            while self.entries > self.max_entries:
+                _, evicted = self.__tables.popitem(last=False)
+                self.entries -= len(evicted)
+        return table
+
+    def clear(self):
+        """ Remove every table from the cache. """
+        with self.__lock:
+            self.__tables.clear()
+            self.entries = 0
+
+
+ALIAS_TABLES = AliasTableCache()
+
+
+def _drop_distribution_cost(plan):
+    """ Return a rough count of the steps `_drop_distribution()` takes for a
+    RollPlan, or 0 if it has no drop mods.
+
+    The dynamic program visits every face, and for each one every number of
+    dice assigned so far, every count of dice on that face, and every kept
+    sum. Only sums of fewer than all the kept dice are carried from one face
+    to the next, and each step also has a fixed overhead of about as much as
+    adding 128 sums.
+
+    """
+    if not (plan.lowest_mod or plan.highest_mod):
+        return 0
+    lowest, highest = _die_value_range(plan.size, plan.local_mod, plan.reroll, plan.explode)
+    faces = highest - lowest + 1
+    kept = plan.number - plan.highest_mod - plan.lowest_mod
+    minimum, maximum = _die_range(plan.size, plan.local_mod, *plan.modifiers())
+    sums = (kept - 1) * (maximum - minimum) + 1
+    return faces * (plan.number - plan.highest_mod) * plan.number * (sums + 128)
+
+
+def _alias_table_affordable(plan):
+    """ Return True if the alias table for a plan is small enough to keep
+    and cheap enough to build.
+
+    """
+    if plan.total_count() > MAX_ALIAS_TABLE_SIZE:
+        return False
+    terms = plan.terms if isinstance(plan, ExpressionPlan) else ((1, plan),)
+    return all(_drop_distribution_cost(term) <= MAX_DROP_DISTRIBUTION_COST for _, term in terms)
+
+
+def _alias_table(plan):
+    """ Return the AliasTable for a plan. """
+    return ALIAS_TABLES.table(plan)
+
+
+# The summary statistics of a summed roll. quantiles is a tuple of
+# (percent, total) pairs, as from `Distribution.percentile()`, and is empty
+# unless quantiles were asked for.
+DiceStats = namedtuple("DiceStats", ["mean", "variance", "minimum", "maximum", "quantiles"])
+
+
+def _run_sums(low, high):
+    """ Return the sum and the sum of squares of the integers from low to
+    high.
+
+    """
+    def squares(n):
+        return n * (n + 1) * (2 * n + 1) // 6
+
+    return ((low + high) * (high - low + 1) // 2, squares(high) - squares(low - 1))
+
+
+def _run_matches(low, high, success):
+    """ Return how many of the integers from low to high are successes. """
+    comparison, target = success
+    bounds = {
+        ">=": (target, high),
+        ">": (target + 1, high),
+        "<=": (low, target),
+        "<": (low, target - 1),
+        "=": (target, target),
+    }[comparison]
+    return max(min(high, bounds[1]) - max(low, bounds[0]) + 1, 0)
+
+
+@lru_cache(maxsize=256)
+def _die_moments(size, local_mod, reroll=0, explode=0, success=None):
+    """ Return the (mean, variance, minimum, maximum) of what a single die
+    adds to the total.
+
+    Each run of equally likely values from `_die_runs()` adds its closed-form
+    sums, so the cost does not grow with the size of the die, and an
+    exploding die adds one term of its geometric tail per extra roll. Values
+    below 0 are clamped to 0, as in `RollPlan.roll()`, except for Fate dice.
+
+    """
+    lowest, highest = _die_value_range(size, local_mod, reroll, explode)
+    clamp = size != "F"
+    runs = [(low + local_mod, high + local_mod, p) for low, high, p in _die_runs(size, reroll, explode)]
+
+    if success is not None:
+        chance = 0.
+        zero_succeeds = COMPARISONS[success[0]](0, success[1])
+        for low, high, p in runs:
+            if clamp and low < 0:
+                if zero_succeeds:
+                    chance += p * (min(high, -1) - low + 1)
+                low = 0
+            if low <= high:
+                chance += p * _run_matches(low, high, success)
+        return (chance, chance * (1. - chance)) + _die_range(size, local_mod, reroll, explode, success)
+
+    # Sum the distance from the lowest value, which keeps the variance exact
+    # under a large local mod. When any value is clamped the lowest value is
+    # 0, so the clamped values add nothing.
+    distance = 0.
+    square = 0.
+    for low, high, p in runs:
+        if clamp:
+            low = max(low, 0)
+        if low <= high:
+            total, total_squares = _run_sums(low - lowest, high - lowest)
+            distance += p * total
+            square += p * total_squares
+
+    return (lowest + distance, max(square - distance * distance, 0.), lowest, highest)
+
+
+def _moments(plan):
+    """ Return the (mean, variance, minimum, maximum) of a plan's summed
+    roll.
+
+    Without drop mods the dice are independent, so the moments of one die
+    are scaled by the number of dice; with drop mods the mean and variance
+    come from the exact distribution.
+
+    """
+    if isinstance(plan, ExpressionPlan):
+        mean = float(plan.constant)
+        variance = 0.
+        minimum = maximum = plan.constant
+        for sign, term in plan.terms:
+            term_mean, term_variance, term_minimum, term_maximum = _moments(term)
+            mean += sign * term_mean
+            variance += term_variance
+            if sign > 0:
+                minimum += term_minimum
+                maximum += term_maximum
+            else:
+                minimum -= term_maximum
+                maximum -= term_minimum
+        return (mean, variance, minimum, maximum)
+
+    if plan.lowest_mod or plan.highest_mod:
+        distribution = plan.distribution()
+        kept = plan.number - plan.highest_mod - plan.lowest_mod
+        minimum, maximum = _die_range(plan.size, plan.local_mod, *plan.modifiers())
+        return (
+            distribution.mean(),
+            distribution.variance(),
+            kept * minimum + plan.global_mod,
+            kept * maximum + plan.global_mod,
+        )
+
+    mean, variance, minimum, maximum = _die_moments(plan.size, plan.local_mod, *plan.modifiers())
+    number = plan.number
+    return (
+        number * mean + plan.global_mod,
+        number * variance,
+        number * minimum + plan.global_mod,
+        number * maximum + plan.global_mod,
+    )
+
+
+@lru_cache(maxsize=1024)
+def _plan_stats(plan, quantiles):
+    """ Return the DiceStats of a plan, remembered for equal plans. """
+    mean, variance, minimum, maximum = _moments(plan)
+    quantiles = tuple(sorted(set(quantiles)))
+    if quantiles:
+        distribution = plan.distribution()
+        quantiles = tuple((q, distribution.percentile(q)) for q in quantiles)
+
+    return DiceStats(mean, variance, minimum, maximum, quantiles)
+
+
+# Bump this whenever a change to how the dice are rolled changes the
+# distribution of the results, so that stored distributions are recomputed.
+ROLL_SEMANTICS_VERSION = 1
+
+
+class RollPlan:
+    """ An immutable, compiled description of how to roll a set of dice.
+
+    A RollPlan holds only the values needed to roll the dice, and none of the
+    parsing machinery, so it is small, safe to share between threads, and
+    cheap to pickle.
+
+    """
+    __slots__ = (
+        "number",
+        "size",
+        "local_mod",
+        "global_mod",
+        "highest_mod",
+        "lowest_mod",
+        "reroll",
+        "explode",
+        "success",
+        "do_sum",
+        "__weakref__",
+    )
+
+    def __init__(self, number, size, local_mod=0, global_mod=0, highest_mod=0, lowest_mod=0, reroll=0, explode=0, success=None):
+        """ Args:
+            number, size, local_mod, global_mod, highest_mod, lowest_mod:
+                The parsed parts of the dice format string.
+            reroll (int): Faces at or below this are rerolled; 0 for none.
+            explode (int): The most extra rolls an exploding die may make; 0
+                if the dice do not explode.
+            success (tuple): A (comparison, target) pair like ('>=', 8) to
+                count the kept dice that pass the comparison, or None.
+
+        """
+        set_value = super().__setattr__
+        set_value("number", number)
+        set_value("size", size)
+        set_value("local_mod", local_mod)
+        set_value("global_mod", global_mod)
+        set_value("highest_mod", highest_mod)
+        set_value("lowest_mod", lowest_mod)
+        set_value("reroll", reroll)
+        set_value("explode", explode)
+        set_value("success", success)
+        # If we have a global mod, we must sum all the dice to apply it, and
+        # counting successes always gives a single number
+        set_value("do_sum", bool(global_mod) or success is not None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RollPlan is immutable; cannot set '{}'".format(name))
+
+    def __delattr__(self, name):
+        raise AttributeError("RollPlan is immutable; cannot delete '{}'".format(name))
+
+    def __reduce__(self):
+        return (self.__class__, self.values() + self.modifiers())
+
+    def __eq__(self, other):
+        if not isinstance(other, RollPlan):
+            return NotImplemented
+        return self.values() + self.modifiers() == other.values() + other.modifiers()
+
+    def __hash__(self):
+        return hash(self.values() + self.modifiers())
+
+    def __repr__(self):
+        return (
+            "RollPlan(number={!r}, size={!r}, local_mod={!r}, global_mod={!r}, highest_mod={!r}, lowest_mod={!r}, "
+            "reroll={!r}, explode={!r}, success={!r})"
+        ).format(*(self.values() + self.modifiers()))
+
+    def values(self):
+        """ Return the parsed values as a tuple of (number, size, local_mod,
+        global_mod, highest_mod, lowest_mod).
+
+        """
+        return (
+            self.number,
+            self.size,
+            self.local_mod,
+            self.global_mod,
+            self.highest_mod,
+            self.lowest_mod,
+        )
+
+    def modifiers(self):
+        """ Return the die modifiers as a tuple of (reroll, explode, success). """
+        return (self.reroll, self.explode, self.success)
+
+    def notation(self):
+        """ Return the canonical dice format string for the plan.
+
+        Every string that parses to an equal plan has the same canonical
+        form, like '4d6-1L' for '4d6-L', '4d6-1l' and '4d6 - L'. Drops and
+        the explosion cap are always written with their count.
+
+        """
+        die = "d{}".format(self.size)
+        if self.reroll:
+            die += "r{}".format(self.reroll)
+        if self.explode:
+            die += "!{}".format(self.explode)
+        if self.local_mod:
+            die = "({}{:+d})".format(die, self.local_mod)
+
+        output = "{}{}".format(self.number, die)
+        if self.global_mod:
+            output += "{:+d}".format(self.global_mod)
+        if self.highest_mod:
+            output += "-{}H".format(self.highest_mod)
+        if self.lowest_mod:
+            output += "-{}L".format(self.lowest_mod)
+        if self.success is not None:
+            output += "{}{}".format(*self.success)
+
+        return output
+
+    def __draw(self, rng, size):
+        """ Return the values of the dice before any mods, as a list if size
+        is an int or as a list of rows if size is a (rows, columns) tuple.
+
+        Rerolled faces are never drawn, and exploding dice are rolled again
+        while they show their highest face, up to the explosion cap.
+
+        """
+        low, high = self.__face_range()
+        values = rng.integers(low, high + 1, size=size)
+        if not self.explode:
+            return values
+
+        numpy = _numpy()
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            values = values.astype(numpy.int64)
+            pending = numpy.nonzero(values == self.size)
+            for _ in range(self.explode):
+                if not len(pending[0]):
+                    break
+                extra = numpy.asarray(rng.integers(1, self.size + 1, size=len(pending[0])))
+                values[pending] += extra
+                again = extra == self.size
+                pending = tuple(index[again] for index in pending)
+            return values
+
+        rows = values if isinstance(size, tuple) else [values]
+        for row in rows:
+            pending = [i for i, value in enumerate(row) if value == self.size]
+            for _ in range(self.explode):
+                if not pending:
+                    break
+                extra = rng.integers(1, self.size + 1, size=len(pending))
+                for i, extra_value in zip(pending, extra):
+                    row[i] += extra_value
+                pending = [i for i, extra_value in zip(pending, extra) if extra_value == self.size]
+
+        return values
+
+    def roll(self, do_sum=False, rng=None):
+        """ Roll the dice and return the result.
+
+        This makes no logging calls; use `trace_roll()` to log each step.
+
+        Args:
+            do_sum (bool): Sum the dice; this is forced on if there is a
+                global mod.
+            rng: A random number generator source accepted by `as_rng()`.
+
+        """
+        # Large summed pools are rolled in chunks to bound their memory use
+        if (self.do_sum or do_sum) and self.number > STREAM_CHUNK_SIZE:
+            return self.stream_sum(rng)
+
+        values = _as_list(self.__draw(as_rng(rng), self.number))
+
+        local_mod = self.local_mod
+        if local_mod:
+            values = [value + local_mod for value in values]
+            # Dice must roll at least 0 after mods, but Fate dice may go negative
+            if local_mod < 0 and self.size != "F":
+                values = [max(value, 0) for value in values]
+
+        if self.lowest_mod or self.highest_mod:
+            values = sorted(values)[self.lowest_mod:self.number - self.highest_mod]
+
+        if self.success is not None:
+            comparison, target = self.success
+            compare = COMPARISONS[comparison]
+            return sum(1 for value in values if compare(value, target)) + self.global_mod
+
+        if self.do_sum or do_sum:
+            return sum(values) + self.global_mod
+
+        return values
+
+    def stream_sum(self, rng=None):
+        """ Roll the dice and return the sum, without holding every die in
+        memory at once.
+
+        The dice are drawn STREAM_CHUNK_SIZE at a time and added to a running
+        total. For drop mods only the lowest_mod lowest and highest_mod
+        highest dice seen so far are kept, and they are taken off the total
+        at the end, so the memory used is bounded by the chunk size and the
+        number of dice dropped rather than by the number of dice.
+
+        Args:
+            rng: A random number generator source accepted by `as_rng()`.
+
+        """
+        rng = as_rng(rng)
+        local_mod = self.local_mod
+        # Dice must roll at least 0 after mods, but Fate dice may go negative
+        clamp = local_mod < 0 and self.size != "F"
+        success = self.success
+        if success is not None:
+            comparison, target = success
+            compare = COMPARISONS[comparison]
+
+        total = 0
+        lowest = []
+        highest = []
+        remaining = self.number
+        while remaining:
+            size = min(remaining, STREAM_CHUNK_SIZE)
+            remaining -= size
+
+            values = _as_list(self.__draw(rng, size))
+            if local_mod:
+                values = [value + local_mod for value in values]
+                if clamp:
+                    values = [max(value, 0) for value in values]
+
+            if success is None:
+                total += sum(values)
+            else:
+                total += sum(1 for value in values if compare(value, target))
+
+            if self.lowest_mod:
+                lowest = heapq.nsmallest(self.lowest_mod, itertools.chain(lowest, values))
+            if self.highest_mod:
+                highest = heapq.nlargest(self.highest_mod, itertools.chain(highest, values))
+
+        # The dropped dice are the lowest and highest of all the dice, so
+        # take them back off the total
+        for value in itertools.chain(lowest, highest):
+            total -= value if success is None else _score(value, success)
+
+        return total + self.global_mod
+
+    def trace_roll(self, do_sum=False, rng=None):
+        """ Roll the dice like `roll()`, logging every die and step. """
+        logging.info("Rolling dice")
+        if self.reroll:
+            logging.debug("Rerolling faces of %i or less.", self.reroll)
+        # Generate rolls, all in one draw
+        rand_vals = _as_list(self.__draw(as_rng(rng), self.number))
+        values = []
+        for rand_val in rand_vals:
+            if self.explode and rand_val > self.size:
+                logging.debug("Die exploded to %i", rand_val)
+            die_val = rand_val + self.local_mod
+            logging.debug("Roll value is %i = %i%i", die_val, rand_val, self.local_mod)
+
+            # Fate Dice use F, and have sides (-1, 0, 1), and may go negative
+            if self.size != "F":
+                die_val = max(die_val, 0)  # Dice must roll at least 0 after mods
+                logging.debug("Roll value is '%i' after max()", die_val)
+
+            values.append(die_val)
+
+        # Remove highest and lowest dice
+        if self.lowest_mod >= 1 or self.highest_mod >= 1:
+            logging.info("Dropping High/Low dice.")
+            start_i = self.lowest_mod
+            end_i = len(values) - self.highest_mod
+            sorted_values = sorted(values)
+
+            logging.debug("Sorted dice values pre-dropping: %s", sorted_values)
+            low_dice = sorted_values[:start_i]
+            if low_dice:
+                logging.debug("Dropping low dice: %s", low_dice)
+
+            high_dice = sorted_values[end_i:]
+            if high_dice:
+                logging.debug("Dropping low dice: %s", high_dice)
+
+            values = sorted_values[start_i:end_i]
+
+        logging.debug("Final die values: %s", values)
+
+        # Count successes
+        if self.success is not None:
+            comparison, target = self.success
+            logging.info("Counting dice %s %i.", comparison, target)
+            values = [_score(value, self.success) for value in values]
+
+        #Return values
+        if self.do_sum or do_sum:
+            logging.info("Summing dice.")
+            output = sum(values) + self.global_mod
+        else:
+            output = values
+
+        logging.debug("Final results: %s", output)
+        return output
+
+    def distribution(self, backend=None):
+        """ Return the exact Distribution of the summed roll, including the
+        global mod.
+
+        Args:
+            backend (str): The name of the convolution backend in
+                CONVOLUTION_BACKENDS to use for pools without drop mods. By
+                default it is chosen from the number and size of the dice.
+
+        Raises:
+            ValueError: If the dice have drop mods and the estimated cost
+                (see `_drop_distribution_cost()`) is greater than
+                MAX_EXACT_DROP_COST.
+
+        """
+        cost = _drop_distribution_cost(self)
+        if cost > MAX_EXACT_DROP_COST:
+            err = "Exact distribution of '{}' is too costly: estimated cost {} is greater than {}.".format(
+                self.notation(), cost, MAX_EXACT_DROP_COST,
+            )
+            raise ValueError(err)
+
+        if backend is None:
+            backend = _choose_backend(self.number, len(self.__die_distribution()[1]))
+        elif backend not in CONVOLUTION_BACKENDS:
+            err = "Unknown convolution backend '{}'.".format(backend)
+            raise ValueError(err)
+
+        if self.lowest_mod or self.highest_mod:
+            minimum, probabilities = _drop_distribution(
+                self.number,
+                self.size,
+                self.local_mod,
+                self.highest_mod,
+                self.lowest_mod,
+                *self.modifiers()
+            )
+        else:
+            minimum, probabilities = _pool_distribution(
+                self.number,
+                self.size,
+                self.local_mod,
+                backend,
+                *self.modifiers()
+            )
+
+        return Distribution(minimum, probabilities).shift(self.global_mod)
+
+    def __die_distribution(self):
+        """ Return the distribution of what one die adds to the total. """
+        return _die_distribution(self.size, self.local_mod, *self.modifiers())
+
+    def total_count(self):
+        """ Return the number of possible totals of the summed roll.
+
+        This comes from the range of a single die, so it is cheap even when
+        the distribution is not.
+
+        """
+        kept = self.number - self.highest_mod - self.lowest_mod
+        minimum, maximum = _die_range(self.size, self.local_mod, *self.modifiers())
+        return kept * (maximum - minimum) + 1
+
+    def sample_sum(self, rng=None):
+        """ Return the summed roll, drawn from a precomputed alias table.
+
+        The table is built from the exact distribution the first time it is
+        needed and kept in ALIAS_TABLES for equal plans afterward, so each
+        draw costs one random number. If the table would have more than
+        MAX_ALIAS_TABLE_SIZE entries, or its drop mods would make the exact
+        distribution cost more than MAX_DROP_DISTRIBUTION_COST, the dice are
+        rolled one by one instead.
+
+        """
+        if not _alias_table_affordable(self):
+            return self.roll(do_sum=True, rng=rng)
+
+        return _alias_table(self).sample(rng)
+
+    def stats(self, quantiles=None):
+        """ Return the DiceStats of the summed roll without rolling any dice.
+
+        The mean, variance, minimum and maximum of pools without drop mods
+        are computed from a single die; the quantiles, and everything for
+        pools with drop mods, come from the exact distribution, which is only
+        built if it is needed. Results are remembered, so asking again about
+        an equal plan is free.
+
+        Args:
+            quantiles (iterable): The percentiles to report, from 0 to 100;
+                none by default.
+
+        """
+        return _plan_stats(self, () if quantiles is None else tuple(quantiles))
+
+    def roll_many(self, n, do_sum=False, rng=None):
+        """ Roll the dice n times in one batch.
+
+        Uses NumPy when it is installed, and a pure Python loop otherwise.
+        Unlike `roll()`, no logging is done per die.
+
+        Args:
+            n (int): The number of times to roll the dice.
+            do_sum (bool): Sum each roll; this is forced on if there is a
+                global mod.
+            rng: A random number generator source accepted by `as_rng()`.
+                With NumPy installed the default is a NumPy Generator.
+
+        Returns:
+            A NumPy array of shape (n,) if summing, otherwise of shape (n,
+            dice kept), or the equivalent list (of lists) without NumPy.
+
+        """
+        if n < 0:
+            err = "Number of rolls {} is less than 0.".format(n)
+            raise ValueError(err)
+
+        do_sum = self.do_sum or do_sum
+        logging.info("Rolling dice %i times", n)
+        if _numpy() is not None:
+            rng = _default_numpy_rng() if rng is None else as_rng(rng)
+            return self.__roll_many_numpy(n, do_sum, rng)
+
+        return self.__roll_many_python(n, do_sum, as_rng(rng))
+
+    def __face_range(self):
+        """ Return the lowest and highest face of a single die that can be
+        drawn, leaving out rerolled faces.
+
+        """
+        if self.size == "F":
+            return (-1, 1)
+        return (self.reroll + 1, self.size)
+
+    def __roll_many_numpy(self, n, do_sum, rng):
+        """ Roll the dice n times using NumPy. """
+        numpy = _numpy()
+        rolls = numpy.array(self.__draw(rng, (n, self.number)), dtype=numpy.int64)
+        rolls += self.local_mod
+        if self.size != "F":
+            numpy.maximum(rolls, 0, out=rolls)  # Dice must roll at least 0 after mods
+
+        start_i = self.lowest_mod
+        end_i = self.number - self.highest_mod
+        if start_i or self.highest_mod:
+            if do_sum:
+                # The order of the kept dice does not matter for the sum, so
+                # a partial sort that fixes the two cut points is enough.
+                rolls = numpy.partition(rolls, sorted({start_i, end_i - 1}), axis=1)
+            else:
+                rolls = numpy.sort(rolls, axis=1)
+            rolls = rolls[:, start_i:end_i]
+
+        if self.success is not None:
+            comparison, target = self.success
+            rolls = COMPARISONS[comparison](rolls, target).astype(numpy.int64)
+
+        if do_sum:
+            return rolls.sum(axis=1) + self.global_mod
+
+        return rolls
+
+    def __roll_many_python(self, n, do_sum, rng):
+        """ Roll the dice n times using only the standard library. """
+        local_mod = self.local_mod
+        clamp = self.size != "F"
+        number = self.number
+        start_i = self.lowest_mod
+        end_i = number - self.highest_mod
+        drop = bool(start_i or self.highest_mod)
+        success = self.success
+
+        results = []
+        for rand_vals in self.__draw(rng, (n, number)):
+            values = [rand_val + local_mod for rand_val in rand_vals]
+            if clamp:
+                values = [max(value, 0) for value in values]
+            if drop:
+                values = sorted(values)[start_i:end_i]
+            if success is not None:
+                values = [_score(value, success) for value in values]
+            if do_sum:
+                results.append(sum(values) + self.global_mod)
+            else:
+                results.append(values)
+
+        return results
+
+
+class ExpressionPlan:
+    """ An immutable, compiled plan for an expression that adds and subtracts
+    several sets of dice and constants, like '3d6 + 2d8 - 1d4 + 5'.
+
+    Each term is a RollPlan without a global mod; the constants are all
+    collected into one. The result is always summed.
+
+    """
+    __slots__ = ("terms", "constant", "__weakref__")
+
+    do_sum = True
+
+    def __init__(self, terms, constant=0):
+        """ Args:
+            terms (iterable): Pairs of (sign, RollPlan), where sign is 1 or -1.
+            constant (int): The sum of the constants in the expression.
+
+        """
+        set_value = super().__setattr__
+        set_value("terms", tuple(terms))
+        set_value("constant", constant)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ExpressionPlan is immutable; cannot set '{}'".format(name))
+
+    def __delattr__(self, name):
+        raise AttributeError("ExpressionPlan is immutable; cannot delete '{}'".format(name))
+
+    def __reduce__(self):
+        return (self.__class__, (self.terms, self.constant))
+
+    def __eq__(self, other):
+        if not isinstance(other, ExpressionPlan):
+            return NotImplemented
+        return (self.terms, self.constant) == (other.terms, other.constant)
+
+    def __hash__(self):
+        return hash((self.terms, self.constant))
+
+    def __repr__(self):
+        return "ExpressionPlan(terms={!r}, constant={!r})".format(self.terms, self.constant)
+
+    def notation(self):
+        """ Return the canonical dice format string for the expression; see
+        `RollPlan.notation()`. The terms keep their order.
+
+        """
+        output = ""
+        for i, (sign, plan) in enumerate(self.terms):
+            if sign < 0:
+                output += "-"
+            elif i:
+                output += "+"
+            output += plan.notation()
+        if self.constant:
+            output += "{:+d}".format(self.constant)
+
+        return output
+
+    def roll(self, do_sum=True, rng=None):
+        """ Roll every term and return the total.
+
+        Args:
+            do_sum (bool): Ignored, since expressions are always summed.
+            rng: A random number generator source accepted by `as_rng()`.
+
+        """
+        rng = as_rng(rng)
+        return self.constant + sum(sign * plan.roll(True, rng) for sign, plan in self.terms)
+
+    def trace_roll(self, do_sum=True, rng=None):
+        """ Roll the expression like `roll()`, logging every die and step. """
+        rng = as_rng(rng)
+        total = self.constant
+        for sign, plan in self.terms:
+            total += sign * plan.trace_roll(True, rng)
+        logging.debug("Final results: %s", total)
+        return total
+
+    def roll_many(self, n, do_sum=True, rng=None):
+        """ Roll the expression n times, rolling each term in one batch.
+
+        Returns:
+            A NumPy array of shape (n,), or a list without NumPy.
+
+        """
+        numpy = _numpy()
+        if numpy is not None:
+            rng = _default_numpy_rng() if rng is None else as_rng(rng)
+            totals = numpy.full(n, self.constant, dtype=numpy.int64)
+            for sign, plan in self.terms:
+                totals += sign * plan.roll_many(n, True, rng)
+            return totals
+
+        rng = as_rng(rng)
+        totals = [self.constant] * n
+        for sign, plan in self.terms:
+            totals = [total + sign * value for total, value in zip(totals, plan.roll_many(n, True, rng))]
+        return totals
+
+    def distribution(self, backend=None):
+        """ Return the exact Distribution of the total, the convolution of
+        the distributions of the terms.
+
+        """
+        output = Distribution(0, (1.,))
+        for sign, plan in self.terms:
+            term = plan.distribution(backend)
+            output = output.add(term if sign > 0 else term.negate())
+
+        return output.shift(self.constant)
+
+    def total_count(self):
+        """ Return the number of possible totals. """
+        return sum(plan.total_count() - 1 for _, plan in self.terms) + 1
+
+    def sample_sum(self, rng=None):
+        """ Return the total, drawn from a precomputed alias table; see
+        `RollPlan.sample_sum()`.
+
+        """
+        if not _alias_table_affordable(self):
+            return self.roll(True, rng)
+
+        return _alias_table(self).sample(rng)
+
+    def stats(self, quantiles=None):
+        """ Return the DiceStats of the total; see `RollPlan.stats()`. The
+        terms are independent, so their means and variances add.
+
+        """
+        return _plan_stats(self, () if quantiles is None else tuple(quantiles))
+
+
+class DistributionStore:
+    """ Keeps exact distributions in a directory so they survive restarts and
+    are shared between processes.
+
+    Each distribution is one file: a fixed header holding the format,
+    ROLL_SEMANTICS_VERSION, the byte order, the minimum, the number of
+    probabilities and the key, followed by the probabilities as 8 byte
+    doubles. Files are read back with `mmap`, and the Distribution wraps the
+    mapped memory directly, so every process reading the same entry shares
+    one copy in the page cache.
+
+    Entries are keyed by the canonical notation of the plan, so equivalent
+    notations share one entry. Entries written under a different
+    ROLL_SEMANTICS_VERSION, or that can not be read, are treated as missing
+    and are replaced when next stored.
+
+    """
+    MAGIC = b"DICEPMF\0"
+    # magic, format, roll semantics version, little endian, minimum, count, key length
+    HEADER = struct.Struct("<8sHIBxqQI")
+    FORMAT = 1
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(plan):
+        """ Return the string that identifies a plan's distribution, its
+        canonical notation.
+
+        """
+        return plan.notation()
+
+    def path(self, key):
+        """ Return the file that holds the distribution for key. """
+        name = hashlib.sha256(key.encode()).hexdigest() + ".pmf"
+        return os.path.join(self.directory, name)
+
+    def __data_offset(self, key_bytes):
+        """ Return where the probabilities start, aligned for doubles. """
+        end = self.HEADER.size + len(key_bytes)
+        return (end + 7) // 8 * 8
+
+    def get(self, plan):
+        """ Return the stored Distribution of plan, or None if there is no
+        current entry for it.
+
+        """
+        import mmap
+
+        key = self.key(plan)
+        try:
+            with open(self.path(key), "rb") as pmf_file:
+                mapped = mmap.mmap(pmf_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # A missing or empty file
+            return None
+
+        key_bytes = key.encode()
+        if len(mapped) < self.HEADER.size:
+            return None
+        magic, file_format, version, little_endian, minimum, count, key_length = self.HEADER.unpack_from(mapped)
+        if (
+            magic != self.MAGIC
+            or file_format != self.FORMAT
+            or version != ROLL_SEMANTICS_VERSION
+            or bool(little_endian) != (sys.byteorder == "little")
+            or mapped[self.HEADER.size:self.HEADER.size + key_length] != key_bytes
+        ):
+            return None
+
+        offset = self.__data_offset(key_bytes)
+        if len(mapped) != offset + 8 * count:
+            return None
+
+        probabilities = memoryview(mapped)[offset:].cast("d")
+        return Distribution(minimum, probabilities)
+
+    def put(self, plan, distribution):
+        """ Store the Distribution of plan, replacing any old entry. """
+        key = self.key(plan)
+        key_bytes = key.encode()
+        header = self.HEADER.pack(
+            self.MAGIC,
+            self.FORMAT,
+            ROLL_SEMANTICS_VERSION,
+            sys.byteorder == "little",
+            distribution.minimum,
+            len(distribution),
+            len(key_bytes),
+        )
+        padding = b"\0" * (self.__data_offset(key_bytes) - len(header) - len(key_bytes))
+
+        # Write to a temporary file and move it into place, so readers never
+        # see a partial entry
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as pmf_file:
+                pmf_file.write(header + key_bytes + padding)
+                array("d", distribution.probabilities).tofile(pmf_file)
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def distribution(self, plan, backend=None):
+        """ Return the Distribution of plan from the store, computing and
+        storing it first if needed.
+
+        """
+        stored = self.get(plan)
+        if stored is not None:
+            return stored
+
+        distribution = plan.distribution(backend)
+        self.put(plan, distribution)
+        # Hand back the mapped copy, so this process shares it too
+        stored = self.get(plan)
+        return distribution if stored is None else stored
+
+
+class ParseCache:
+    """ A bounded, thread-safe, least-recently-used cache of parsed dice.
+
+    Parsing a dice format string requires building a tokenizer, a table, and
+    a parser, and then running the full LL Parser loop. The result of all that
+    work is just a handful of integers, so we keep those around keyed by the
+    normalized tokens of the dice format string.
+
+    """
+    # Drop modifiers are case insensitive, so "4d6-L" and "4d6-l" share a key
+    NORMALIZE_TABLE = str.maketrans({'L': 'l', 'H': 'h'})
+
+    def __init__(self, maxsize=1024):
+        if maxsize < 1:
+            err = "Cache size {} is less than 1.".format(maxsize)
+            raise ValueError(err)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @classmethod
+    def normalize(cls, tokens):
+        """ Return the key used to store the tokens of a dice format string. """
+        return "".join(tokens).translate(cls.NORMALIZE_TABLE)
+
+    def get(self, key):
+        """ Return the entry for key, or None if it is not in the cache.
+
+        A successful lookup marks the entry as the most recently used.
+
+        """
+        with self.__lock:
+            try:
+                value = self.__entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """ Store value under key, evicting the least recently used entry if
+        the cache is full.
+
+        """
+        with self.__lock:
+            self.__entries[key] = value
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """ Remove all entries and reset the counters. """
+        with self.__lock:
+            self.__entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def info(self):
+        """ Return the cache counters as a dictionary. """
+        with self.__lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self.__entries),
+                "maxsize": self.maxsize,
+            }
+
+
+# The cache used by Dice when it is built with the default parser, tokenizer,
+# and table.
+PARSE_CACHE = ParseCache()
+
+
+# A constant, or the sign and count that start a new set of dice
+SIGNED_INT_RE = re.compile(r"[+-][0-9]+$")
+
+
+def split_expression(tokens):
+    """ Split the tokens of an expression into its sets of dice and its
+    constants.
+
+    A signed integer outside of parentheses starts a new set of dice if it is
+    followed by a die or a parenthesis, as with '+2' 'd8' in '3d6+2d8', and
+    is a constant otherwise.
+
+    Args:
+        tokens (iterable): Tokens from a tokenizer.
+
+    Returns:
+        tuple: (terms, constant), where terms is a list of (sign, tokens)
+            pairs, each holding the tokens for one set of dice without its
+            sign, and constant is the sum of the constants.
+
+    """
+    tokens = tuple(tokens)
+    terms = []
+    constant = 0
+    current = None
+    depth = 0
+    for i, token in enumerate(tokens):
+        if depth == 0 and SIGNED_INT_RE.match(token):
+            next_token = tokens[i + 1] if i + 1 < len(tokens) else ""
+            if next_token[:1] in ("d", "("):
+                current = [token[1:]]
+                terms.append((-1 if token[0] == "-" else 1, current))
+            else:
+                constant += int(token)
+            continue
+
+        if current is None:
+            current = []
+            terms.append((1, current))
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        current.append(token)
+
+    return ([(sign, tuple(term)) for sign, term in terms], constant)
+
+
+class PlanInterner:
+    """ Hands out one shared plan for every group of equal plans.
+
+    Plans are looked up by their canonical notation. Only weak references
+    are kept, so a plan is forgotten once nothing else uses it.
+
+    """
+    def __init__(self):
+        self.__plans = weakref.WeakValueDictionary()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__plans)
+
+    def intern(self, plan):
+        """ Return the shared plan equal to plan, making plan the shared one
+        if there is none yet.
+
+        """
+        key = plan.notation()
+        with self.__lock:
+            shared = self.__plans.get(key)
+            if shared is None:
+                self.__plans[key] = shared = plan
+        return shared
+
+
+INTERNED_PLANS = PlanInterner()
+
+
+def canonical(dice_str):
+    """ Return the canonical form of a dice format string.
+
+    Args:
+        dice_str (str): A dice format string, like '4d6-L'.
+
+    Returns:
+        str: The notation of the parsed plan, like '4d6-1L', which is the
+            same for every string that rolls the same way.
+
+    """
+    return Dice(dice_str).plan.notation()
+
+
+# Nanosecond timer; perf_counter_ns is only in Python 3.7 and later
+_now_ns = getattr(time, "perf_counter_ns", None) or (lambda: int(time.perf_counter() * 1e9))
+
+
+class Instrumentation:
+    """ Records how often each stage of building and rolling dice runs and how
+    long it takes, and how many dice of each size are rolled.
+
+    The stages are 'tokenize', 'cache_lookup', 'parse', 'validate' and
+    'roll'. Nothing is recorded unless an Instrumentation is installed with
+    `instrument()`; while none is, the only cost is one check of a module
+    global.
+
+    """
+    STAGES = ("tokenize", "cache_lookup", "parse", "validate", "roll")
+    # Upper bounds of the histogram buckets used in the Prometheus export
+    DIE_COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+    DIE_SIZE_BUCKETS = (2, 3, 4, 6, 8, 10, 12, 20, 100)
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """ Forget everything recorded so far. """
+        with self.__lock:
+            self.counts = Counter()
+            self.nanoseconds = Counter()
+            self.die_counts = Counter()
+            self.die_sizes = Counter()
+
+    def lap(self, stage, start):
+        """ Record that stage ran from start, in nanoseconds, until now, and
+        return now so it can start the next stage.
+
+        """
+        now = _now_ns()
+        with self.__lock:
+            self.counts[stage] += 1
+            self.nanoseconds[stage] += now - start
+        return now
+
+    def observe(self, plan, rolls=1):
+        """ Record the number and size of the dice in plan, rolled rolls
+        times.
+
+        """
+        terms = plan.terms if isinstance(plan, ExpressionPlan) else ((1, plan),)
+        with self.__lock:
+            for _, term in terms:
+                self.die_counts[term.number] += rolls
+                # Fate dice have three faces
+                self.die_sizes[3 if term.size == "F" else term.size] += rolls
+
+    def as_dict(self):
+        """ Return everything recorded as a dictionary of plain values. """
+        with self.__lock:
+            return {
+                "stages": {
+                    stage: {"count": self.counts[stage], "nanoseconds": self.nanoseconds[stage]}
+                    for stage in self.STAGES
+                },
+                "die_counts": dict(self.die_counts),
+                "die_sizes": dict(self.die_sizes),
+            }
+
+    def prometheus(self, prefix="dice"):
+        """ Return everything recorded in the Prometheus text exposition
+        format.
+
+        """
+        data = self.as_dict()
+        lines = [
+            "# HELP {}_stage_calls_total Number of times each stage ran.".format(prefix),
+            "# TYPE {}_stage_calls_total counter".format(prefix),
+        ]
+        for stage, values in data["stages"].items():
+            lines.append('{}_stage_calls_total{{stage="{}"}} {}'.format(prefix, stage, values["count"]))
+        lines += [
+            "# HELP {}_stage_nanoseconds_total Time spent in each stage.".format(prefix),
+            "# TYPE {}_stage_nanoseconds_total counter".format(prefix),
+        ]
+        for stage, values in data["stages"].items():
+            lines.append('{}_stage_nanoseconds_total{{stage="{}"}} {}'.format(prefix, stage, values["nanoseconds"]))
+
+        histograms = (
+            ("die_count", "Number of dice in each roll.", data["die_counts"], self.DIE_COUNT_BUCKETS),
+            ("die_size", "Size of the dice in each roll.", data["die_sizes"], self.DIE_SIZE_BUCKETS),
+        )
+        for name, description, counts, buckets in histograms:
+            name = "{}_{}".format(prefix, name)
+            lines += [
+                "# HELP {} {}".format(name, description),
+                "# TYPE {} histogram".format(name),
+            ]
+            for bound in buckets:
+                total = sum(count for value, count in counts.items() if value <= bound)
+                lines.append('{}_bucket{{le="{}"}} {}'.format(name, bound, total))
+            lines.append('{}_bucket{{le="+Inf"}} {}'.format(name, sum(counts.values())))
+            lines.append("{}_sum {}".format(name, sum(value * count for value, count in counts.items())))
+            lines.append("{}_count {}".format(name, sum(counts.values())))
+
+        return "\n".join(lines) + "\n"
+
+
+# The installed Instrumentation, or None when instrumentation is off
+INSTRUMENTATION = None
+
+
+@contextmanager
+def instrument(instrumentation=None):
+    """ Record the stages of every Dice built and rolled inside the block.
+
+    Args:
+        instrumentation (Instrumentation): Where to record; a new one by
+            default.
+
+    Yields:
+        Instrumentation: The instrumentation that is recording.
+
+    """
+    global INSTRUMENTATION
+    previous = INSTRUMENTATION
+    INSTRUMENTATION = Instrumentation() if instrumentation is None else instrumentation
+    try:
+        yield INSTRUMENTATION
+    finally:
+        INSTRUMENTATION = previous
+
+
+#Dice
+class Dice:
+    """ A class to roll dice based on a dice format string.
+
+    Dice can not be changed once they are built: the parsing machinery is
+    thrown away and only the immutable plan is kept, so one instance can be
+    rolled from many threads at once without locks. Pass rng="thread" to give
+    each thread its own random number generator as well.
+
+    """
+    __slots__ = ("dice_str", "rng", "trace", "plan")
+
+    def __init__(self, dice_str, parser=LLParser, tokenizer=DiceTokenizer, table=DiceTable, rng=None, trace=None):
+        """ Sets up the dice by parsing a string of its type: 3d5
+
+        The dice draw from rng, any source accepted by `as_rng()`. By
+        default `roll()` uses the global random module, so `random.seed()`
+        makes it reproducible, while `roll_many()` uses a NumPy Generator of
+        its own when NumPy is installed, which `random.seed()` does not
+        affect. Pass rng to make batches reproducible as well.
+
+        If trace is True every roll logs each die, as in
+        `RollPlan.trace_roll()`; if it is False rolls make no logging calls.
+        By default tracing is on if debug logging is enabled when the Dice
+        are built.
+
+        """
+        set_value = super().__setattr__
+        set_value("dice_str", dice_str)
+        set_value("rng", None if rng is None else as_rng(rng))
+        set_value("trace", is_tracing() if trace is None else trace)
+
+        # The cache only holds the results of the default parsing machinery,
+        # since a custom parser could produce different values for the same
+        # string.
+        use_cache = parser is LLParser and tokenizer is DiceTokenizer and table is DiceTable
+        set_value("plan", self.__plan(parser, tokenizer, table, use_cache))
+
+    def __plan(self, parser, tokenizer, table, use_cache):
+        """ Return the plan of the dice format string, from the parse cache
+        if use_cache is True and it is there, and by parsing it otherwise.
+
+        """
+        stats = INSTRUMENTATION
+        start = _now_ns() if stats is not None else 0
+
+        tokens = tuple(tokenizer(self.dice_str))
+        if stats is not None:
+            start = stats.lap("tokenize", start)
+
+        key = ParseCache.normalize(tokens) if use_cache else None
+        plan = PARSE_CACHE.get(key) if use_cache else None
+        if stats is not None and use_cache:
+            start = stats.lap("cache_lookup", start)
+        if plan is not None:
+            if self.trace:
+                logging.debug("Found roll plan in cache: %s", plan)
+            return plan
+
+        # Equivalent strings, like '4d6-L' and '4d6-1l', share one plan
+        plan = INTERNED_PLANS.intern(self.__compile(tokens, parser, table, stats, start))
+
+        # Only valid dice are cached, so invalid strings raise every time
+        if use_cache:
+            PARSE_CACHE.put(key, plan)
+
+        return plan
+
+    def __compile(self, tokens, parser, table, stats, start):
+        """ Parse and check the tokens of the whole dice format string and
+        return its plan.
+
+        """
+        terms, constant = split_expression(tokens)
+        if not terms:
+            err = "No dice found in dice format string '{}'.".format(self.dice_str)
+            raise ValueError(err)
+
+        plans = []
+        for sign, term_tokens in terms:
+            plan = RollPlan(*self.__parse(parser, term_tokens, table))
+            if stats is not None:
+                start = stats.lap("parse", start)
+
+            # Error checking to make sure the above values lead to valid
+            # combinations of dice.
+            self.__do_error_checking(plan)
+            if stats is not None:
+                start = stats.lap("validate", start)
+            plans.append((sign, plan))
+
+        # A single set of dice is rolled with its constants as the global mod
+        if len(plans) == 1 and plans[0][0] == 1:
+            plan = plans[0][1]
+            values = plan.values()
+            plan = RollPlan(*(values[:3] + (values[3] + constant,) + values[4:] + plan.modifiers()))
+            if plan.do_sum and self.trace:
+                logging.info("Turning on summing as required by presence of a global mod.")
+        else:
+            plan = ExpressionPlan(plans, constant)
+
+        return plan
+
+    @classmethod
+    def from_many(cls, notations, rng=None, trace=None):
+        """ Build Dice for many dice format strings at once.
+
+        Each distinct string is parsed once, with one table shared by the
+        whole batch, and the Dice for equal strings share one plan. Strings
+        that can not be parsed do not stop the batch.
+
+        Args:
+            notations (iterable): The dice format strings.
+            rng, trace: As for `Dice()`, shared by all the Dice.
+
+        Returns:
+            tuple: A list with the Dice for each string, or None where it
+                failed, and a dictionary of the exception raised for each
+                index that failed.
+
+        """
+        notations = list(notations)
+        rng = None if rng is None else as_rng(rng)
+        trace = is_tracing() if trace is None else trace
+
+        # The table only holds the values of the string being parsed, so it
+        # can be reset and reused instead of being rebuilt for every string
+        shared_table = DiceTable()
+
+        def reuse_table():
+            shared_table.reset()
+            return shared_table
+
+        # The (plan, error) of each distinct string in the batch
+        built = {}
+        output = [None] * len(notations)
+        errors = {}
+        for i, dice_str in enumerate(notations):
+            dice = cls.__new__(cls)
+            set_value = super(Dice, dice).__setattr__
+            set_value("dice_str", dice_str)
+            set_value("rng", rng)
+            set_value("trace", trace)
+
+            result = built.get(dice_str)
+            if result is None:
+                try:
+                    result = built[dice_str] = (dice.__plan(LLParser, DiceTokenizer, reuse_table, True), None)
+                except (ValueError, RuntimeError) as err:
+                    result = built[dice_str] = (None, err)
+
+            plan, err = result
+            if err is not None:
+                errors[i] = err
+                continue
+            set_value("plan", plan)
+            output[i] = dice
+
+        return (output, errors)
+
+    def __reduce__(self):
+        # Rebuilt from the string, which finds the plan in the parse cache;
+        # the per-thread stream is rebuilt as a new one
+        rng = "thread" if self.rng is THREAD_STREAM else self.rng
+        return (self.__class__, (self.dice_str, LLParser, DiceTokenizer, DiceTable, rng, self.trace))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Dice are immutable; cannot set '{}'".format(name))
+
+    def __delattr__(self, name):
+        raise AttributeError("Dice are immutable; cannot delete '{}'".format(name))
+
+    # The parsed values live on the immutable plan; expressions with more
+    # than one set of dice only have do_sum
+    number = property(lambda self: self.plan.number)
+    size = property(lambda self: self.plan.size)
+    local_mod = property(lambda self: self.plan.local_mod)
+    global_mod = property(lambda self: self.plan.global_mod)
+    highest_mod = property(lambda self: self.plan.highest_mod)
+    lowest_mod = property(lambda self: self.plan.lowest_mod)
+    do_sum = property(lambda self: self.plan.do_sum)
+
+    def __parse(self, parser, tokens, table):
+        """ Run the parser over the tokens for one set of dice and return the
+        parsed values as a tuple of (number, size, local_mod, global_mod,
+        highest_mod, lowest_mod, reroll, explode, success).
+
+        """
+        table = table()
+        parser(table, tokens)
+        saved_value_table = table.saved_value_table
+
+        if self.trace:
+            logging.debug("Saved values: %s", saved_value_table)
+
+        number = int(saved_value_table[StackToken.die_num])
+        size = saved_value_table[StackToken.die_size][1:]
+        if size != "F":
+            size = int(size)
+
+        return (
+            number,
+            size,
+            self.__get_die_mod(saved_value_table, StackToken.local_mod),
+            self.__get_die_mod(saved_value_table, StackToken.global_mod),
+            self.__get_drop_mod(saved_value_table, StackToken.drop_high),
+            self.__get_drop_mod(saved_value_table, StackToken.drop_low),
+            self.__get_reroll(saved_value_table),
+            self.__get_explode(saved_value_table),
+            self.__get_success(saved_value_table),
+        )
+
+    @staticmethod
+    def __do_error_checking(plan):
+        # If we are rolling 0 (or fewer) dice
+        if plan.number < 1:
+            err = "Number of dice {} is less than 1.".format(plan.number)
+            raise ValueError(err)
+
+        # If the die size is less than 2, then there are no interesting results
+        if plan.size != "F" and plan.size < 2:
+            err = "Die size of {} is less than 2.".format(plan.size)
+            raise ValueError(err)
+
+        # If we have zero (or fewer) dice left after dropping
+        if plan.highest_mod + plan.lowest_mod >= plan.number:
+            dropped = plan.highest_mod + plan.lowest_mod
+            err = "Number of dice dropped ({}) greater than or equal to number rolled ({}).".format(dropped, plan.number)
+            raise ValueError(err)
+
+        # If the local mod is too large, all rolls will be 0
+        # (but Fate dice are allowed to go negative, so we ignore in that case)
+        if plan.size != "F" and plan.size + plan.local_mod <= 0:
+            err = "Local mod {} is larger than die size {}; all rolls would be 0!".format(plan.local_mod, plan.size)
+            raise ValueError(err)
+
+        # Fate dice have no highest face to explode on, and rerolling their
+        # negative faces is not supported
+        if plan.size == "F" and (plan.reroll or plan.explode):
+            err = "Fate dice cannot be rerolled or exploded."
+            raise ValueError(err)
+
+        # If every face would be rerolled, the dice could never stop rolling
+        if plan.size != "F" and plan.reroll >= plan.size:
+            err = "Reroll of {} or less leaves no faces on a die of size {}.".format(plan.reroll, plan.size)
+            raise ValueError(err)
+
+        # The explosion cap bounds the cost of a roll and the size of the
+        # exact distribution
+        if plan.explode > MAX_EXPLODE_CAP:
+            err = "Explosion cap {} is greater than {}.".format(plan.explode, MAX_EXPLODE_CAP)
+            raise ValueError(err)
+
+    @staticmethod
+    def __get_die_mod(saved_value_table, mod_str):
+        """ Get general die mod """
+        mod = saved_value_table.get(mod_str, None)
+        if mod is None:
+            return 0
+
+        return int(mod)
+
+    @staticmethod
+    def __get_drop_mod(saved_value_table, mod_str):
+        """ Get general drop mod """
+        mod = saved_value_table[mod_str]
+
+        # No modifier
+        if mod is None:
+            return 0
+
+        # See if the modifier is just a switch like -H,
+        # or has a number like -2H
+        mod = mod[1:]  # Drop -
+        mod = mod.rstrip('HhLl')
+        if mod:
+            return int(mod)
+
+        # No number, so modifier is 1
+        return 1
+
+    @staticmethod
+    def __get_reroll(saved_value_table):
+        """ Get the highest face to reroll, or 0 if there is none """
+        mod = saved_value_table.get(StackToken.reroll)
+        if mod is None:
+            return 0
+
+        return int(mod[1:])  # Drop r
+
+    @staticmethod
+    def __get_explode(saved_value_table):
+        """ Get the explosion cap, or 0 if the dice do not explode """
+        mod = saved_value_table.get(StackToken.explode)
+        if mod is None:
+            return 0
+
+        # A bare ! uses the default cap
+        mod = mod[1:]  # Drop !
+        if not mod:
+            return EXPLODE_CAP
+
+        # A cap of 0 would mean the dice never explode
+        cap = int(mod)
+        if cap < 1:
+            err = "Explosion cap {} is less than 1.".format(cap)
+            raise ValueError(err)
+
+        return cap
+
+    @staticmethod
+    def __get_success(saved_value_table):
+        """ Get the success comparison as a (comparison, target) tuple, or
+        None if the dice are summed.
+
+        """
+        mod = saved_value_table.get(StackToken.success)
+        if mod is None:
+            return None
+
+        comparison = mod.rstrip('0123456789')
+        return (comparison, int(mod[len(comparison):]))
+
+    def roll(self, do_sum=False, rng=None):
+        """ Roll the dice and return the result.
+
+        The dice draw from rng if it is given, and from the generator they
+        were built with otherwise.
+
+        """
+        rng = self.rng if rng is None else rng
+        stats = INSTRUMENTATION
+        if stats is None:
+            if self.trace:
+                return self.plan.trace_roll(do_sum, rng)
+            return self.plan.roll(do_sum, rng)
+
+        start = _now_ns()
+        if self.trace:
+            result = self.plan.trace_roll(do_sum, rng)
+        else:
+            result = self.plan.roll(do_sum, rng)
+        stats.lap("roll", start)
+        stats.observe(self.plan)
+        return result
+
+    def roll_many(self, n, do_sum=False, rng=None):
+        """ Roll the dice n times in one batch; see `RollPlan.roll_many()`. """
+        rng = self.rng if rng is None else rng
+        stats = INSTRUMENTATION
+        if stats is None:
+            return self.plan.roll_many(n, do_sum, rng)
+
+        start = _now_ns()
+        result = self.plan.roll_many(n, do_sum, rng)
+        stats.lap("roll", start)
+        stats.observe(self.plan, n)
+        return result
+
+    def distribution(self, backend=None, store=None):
+        """ Return the exact Distribution of the summed roll; see
+        `RollPlan.distribution()`.
+
+        If a DistributionStore is given, the distribution is read from it,
+        and computed and saved there if it is missing.
+
+        """
+        if store is not None:
+            return store.distribution(self.plan, backend)
+        return self.plan.distribution(backend)
+
+    def sample_sum(self, rng=None):
+        """ Return the summed roll, drawn from a precomputed alias table; see
+        `RollPlan.sample_sum()`.
+
+        """
+        return self.plan.sample_sum(self.rng if rng is None else rng)
+
+    def notation(self):
+        """ Return the canonical dice format string; see
+        `RollPlan.notation()`.
+
+        """
+        return self.plan.notation()
+
+    def stats(self, quantiles=None):
+        """ Return the mean, variance, minimum, maximum and any quantiles
+        asked for of the summed roll; see `RollPlan.stats()`.
+
+        """
+        return self.plan.stats(quantiles)
+
+
+def compile(dice_str):
+    """ Parse a dice format string and return its immutable RollPlan.
+
+    Args:
+        dice_str (str): A dice format string, like '4d6-L'.
+
+    Returns:
+        RollPlan: The compiled plan, which can be rolled with
+            `RollPlan.roll()`.
+
+    """
+    return Dice(dice_str).plan
+
+
+def _simulate_shard(dice_str, n, rng, chunk_size):
+    """ Roll dice_str n times and return a Counter of the summed results.
+
+    This runs inside each worker process, so it only receives the dice string
+    and a random number generator, and only returns the counts.
+
+    """
+    plan = compile(dice_str)
+    numpy = _numpy()
+    counts = Counter()
+    remaining = n
+    while remaining:
+        size = min(chunk_size, remaining)
+        totals = plan.roll_many(size, do_sum=True, rng=rng)
+        if numpy is not None:
+            values, frequencies = numpy.unique(totals, return_counts=True)
+            for value, frequency in zip(values.tolist(), frequencies.tolist()):
+                counts[value] += frequency
+        else:
+            counts.update(totals)
+        remaining -= size
+
+    return counts
+
+
+def simulate(dice_str, n, workers=None, seed=None, chunk_size=100000):
+    """ Roll dice_str n times across a pool of processes and return a
+    histogram of the summed results.
+
+    Each worker gets its own independent random number stream spawned from
+    seed, rolls its share of the dice in batches, and sends back only its
+    counts.
+
+    Args:
+        dice_str (str): A dice format string, like '8d6-2L+4'.
+        n (int): The total number of rolls.
+        workers (int): The number of processes; defaults to the number of
+            CPUs. With 1 worker everything runs in this process.
+        seed (int): Seed for the random number streams, for reproducible
+            results with the same number of workers.
+        chunk_size (int): The number of rolls made in each batch.
+
+    Returns:
+        Counter: The number of times each total was rolled.
+
+    """
+    if n < 0:
+        err = "Number of rolls {} is less than 0.".format(n)
+        raise ValueError(err)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        err = "Number of workers {} is less than 1.".format(workers)
+        raise ValueError(err)
+
+    # Check the dice string here so a bad one fails before starting workers
+    compile(dice_str)
+
+    numpy = _numpy()
+    base_rng = numpy.random.default_rng(seed) if numpy is not None else RandomStream(seed)
+    rngs = spawn_rngs(base_rng, workers)
+    shards = [n // workers + (1 if i < n % workers else 0) for i in range(workers)]
+
+    if workers == 1:
+        return _simulate_shard(dice_str, shards[0], rngs[0], chunk_size)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    counts = Counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_simulate_shard, dice_str, shard, rng, chunk_size)
+            for shard, rng in zip(shards, rngs)
+        ]
+        for future in futures:
+            counts.update(future.result())
+
+    return counts
+
+
+def run_batch(lines, output, errors, do_sum=False, flush_every=1000):
+    """ Roll the dice notation on each line and write one result per line.
+
+    Lines that can not be rolled are reported to errors with their line
+    number and produce an empty output line, so output line N always belongs
+    to input line N. Output is written in blocks of flush_every lines.
+
+    Args:
+        lines (iterable): The dice notations, one per item.
+        output (file): Where the results are written.
+        errors (file): Where bad lines are reported.
+        do_sum (bool): Sum the results of each roll.
+        flush_every (int): The number of results to buffer before writing.
+
+    Returns:
+        int: The number of lines that could not be rolled.
+
+    """
+    buffer = []
+    failures = 0
+    for line_number, line in enumerate(lines, 1):
+        dice_str = line.strip()
+        try:
+            # Repeated notations are parsed once by the parse cache
+            buffer.append(str(compile(dice_str).roll(do_sum)))
+        except Exception as err:
+            failures += 1
+            buffer.append("")
+            errors.write("line {}: {!r}: {}\n".format(line_number, dice_str, err))
+
+        if len(buffer) >= flush_every:
+            output.write("\n".join(buffer) + "\n")
+            output.flush()
+            buffer = []
+
+    if buffer:
+        output.write("\n".join(buffer) + "\n")
+        output.flush()
+
+    return failures
+
+
+def main(argv=None):
+    # Command line parsing
+    parser = argparse.ArgumentParser(
+        prog="Dice",
+        description="A very complicated way of rolling dice.",
+    )
+    parser.add_argument("-v", "--version", action="version", version="%(prog)s 4.1.0")
+    parser.add_argument("dice_notation", type=str, nargs="?", help="the dice notation for the dice to roll, such as '4d6'")
+    parser.add_argument("-s", "--sum", help="sum the results of the roll", action="store_true", default=False)
+    parser.add_argument(
+        "-b",
+        "--batch",
+        help="roll the dice notation on each line of FILE (or stdin if no FILE is given) and print one result per line",
+        nargs="?",
+        const="-",
+        metavar="FILE",
+    )
+    parser.add_argument(
+        "--log",
+        help="set the logging level, defaults to WARNING",
+        dest="log_level",
+        default=logging.WARNING,
+        choices=[
+            'DEBUG',
+            'INFO',
+            'WARNING',
+            'ERROR',
+            'CRITICAL',
+        ],
+    )
+
+    args = parser.parse_args(argv)
+
+    if (args.dice_notation is None) == (args.batch is None):
+        parser.error("exactly one of dice_notation or --batch is required")
+
+    # Set the logging level based on the arguments
+    logging.basicConfig(level=args.log_level)
+
+    logging.debug("Arguments: %s", args)
+
+    # Roll every line of the input
+    if args.batch is not None:
+        if args.batch == "-":
+            failures = run_batch(sys.stdin, sys.stdout, sys.stderr, args.sum)
+        else:
+            with open(args.batch) as batch_file:
+                failures = run_batch(batch_file, sys.stdout, sys.stderr, args.sum)
+        sys.exit(1 if failures else 0)
 
     # Set up and roll the dice
     d = Dice(args.dice_notation)
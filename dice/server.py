@@ -0,0 +1,290 @@
+#!/usr/bin/python3
+""" A server that rolls dice for clients sending line-delimited JSON, and the
+entry point of the `dice-server` console script.
+
+"""
+
+from collections import deque
+import argparse
+import asyncio
+import json
+import logging
+import math
+import time
+
+from dice.dice import compile
+
+
+# The number of requests one connection can have waiting for an answer before
+# the server stops reading from it
+MAX_PENDING_REQUESTS = 1000
+
+# get_running_loop() is only in Python 3.7 and later; before then
+# get_event_loop() returns the running loop when called from a coroutine
+get_running_loop = getattr(asyncio, "get_running_loop", asyncio.get_event_loop)
+
+
+class LatencyStats:
+    """ Keeps the most recent request latencies and reports their percentiles.
+
+    Only the last `window` latencies are kept, so the percentiles follow the
+    current load and memory use stays fixed.
+
+    """
+    def __init__(self, window=10000):
+        self.count = 0
+        self.__latencies = deque(maxlen=window)
+
+    def record(self, seconds):
+        """ Record the latency of one request. """
+        self.count += 1
+        self.__latencies.append(seconds)
+
+    def percentile(self, q):
+        """ Return the smallest recorded latency, in seconds, that at least q
+        percent of the recent requests were at or below, or None if no
+        requests have been recorded.
+
+        """
+        if not self.__latencies:
+            return None
+        latencies = sorted(self.__latencies)
+        index = max(int(math.ceil(q / 100. * len(latencies))) - 1, 0)
+        return latencies[index]
+
+    def snapshot(self):
+        """ Return the request count and p50/p99 latencies in milliseconds as
+        a dictionary.
+
+        """
+        p50 = self.percentile(50)
+        p99 = self.percentile(99)
+        return {
+            "count": self.count,
+            "p50_ms": None if p50 is None else p50 * 1e3,
+            "p99_ms": None if p99 is None else p99 * 1e3,
+        }
+
+
+class RollServer:
+    """ Rolls dice for clients that send line-delimited JSON requests.
+
+    Each request is a JSON object on its own line, like
+    {"id": 1, "notation": "4d6-L", "sum": true}, and is answered with a line
+    like {"id": 1, "result": 13} or {"id": 1, "error": "..."}. The request
+    {"stats": true} is answered with the request, batch and latency counters.
+
+    Requests on one connection are handled concurrently, so answers may come
+    back out of order and carry the request's id. At most max_pending
+    requests from one connection are handled at a time; the server stops
+    reading from a connection until one of them is answered. Requests for the
+    same notation that arrive in the same pass of the event loop, from any
+    connections, are rolled together in one call to `RollPlan.roll_many()`.
+
+    """
+    def __init__(self, max_pending=MAX_PENDING_REQUESTS):
+        if max_pending < 1:
+            err = "Maximum pending requests {} is less than 1.".format(max_pending)
+            raise ValueError(err)
+        self.max_pending = max_pending
+        self.latency = LatencyStats()
+        self.batches = 0
+        self.server = None
+        # Waiting futures keyed by (plan, do_sum)
+        self.__pending = {}
+        self.__clients = set()
+
+    async def start(self, host="127.0.0.1", port=8765, path=None):
+        """ Start listening on a Unix socket at path if it is given, and on
+        host and port otherwise.
+
+        """
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.__connect, path)
+        else:
+            self.server = await asyncio.start_server(self.__connect, host, port)
+        return self.server
+
+    async def close(self):
+        """ Stop listening, disconnect every client, and wait for the server
+        to close.
+
+        """
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+        for client in list(self.__clients):
+            client.cancel()
+        if self.__clients:
+            await asyncio.wait(self.__clients)
+
+    def __connect(self, reader, writer):
+        """ Handle a new client in its own task, so it can be cancelled. """
+        client = get_running_loop().create_task(self.handle_client(reader, writer))
+        self.__clients.add(client)
+        client.add_done_callback(self.__clients.discard)
+
+    def stats(self):
+        """ Return the request, batch and latency counters as a dictionary. """
+        stats = self.latency.snapshot()
+        stats["batches"] = self.batches
+        return stats
+
+    async def handle_client(self, reader, writer):
+        """ Answer every request line from one client until it disconnects. """
+        loop = get_running_loop()
+        tasks = set()
+        slots = asyncio.Semaphore(self.max_pending)
+
+        def finish(task):
+            tasks.discard(task)
+            slots.release()
+
+        try:
+            while True:
+                await slots.acquire()
+                line = await reader.readline()
+                if not line:
+                    break
+                task = loop.create_task(self.handle_line(line, writer))
+                tasks.add(task)
+                task.add_done_callback(finish)
+
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def handle_line(self, line, writer):
+        """ Answer one request line. """
+        start = time.perf_counter()
+        response = await self.respond(line)
+        writer.write(json.dumps(response).encode() + b"\n")
+        try:
+            await writer.drain()
+        except ConnectionError:
+            return  # The client has gone away, so there is no one to answer
+        self.latency.record(time.perf_counter() - start)
+
+    async def respond(self, line):
+        """ Return the response to one request line as a dictionary. """
+        try:
+            request = json.loads(line.decode())
+            if not isinstance(request, dict):
+                raise ValueError("Request is not a JSON object.")
+        except ValueError as err:
+            return {"id": None, "error": str(err)}
+
+        response = {"id": request.get("id")}
+        if request.get("stats"):
+            response["stats"] = self.stats()
+            return response
+
+        try:
+            plan = compile(str(request["notation"]))
+            result = await self.roll(plan, bool(request.get("sum", False)))
+        except KeyError:
+            response["error"] = "Request has no 'notation'."
+        except Exception as err:
+            response["error"] = str(err)
+        else:
+            response["result"] = result
+        return response
+
+    def roll(self, plan, do_sum):
+        """ Return a future for one roll of plan, sharing a batch with every
+        other roll of plan requested before the batch runs.
+
+        """
+        loop = get_running_loop()
+        key = (plan, do_sum)
+        future = loop.create_future()
+        waiting = self.__pending.get(key)
+        if waiting is None:
+            waiting = self.__pending[key] = []
+            loop.call_soon(self.__roll_batch, key)
+        waiting.append(future)
+        return future
+
+    def __roll_batch(self, key):
+        """ Roll every waiting request for one plan at once. """
+        plan, do_sum = key
+        waiting = self.__pending.pop(key)
+        self.batches += 1
+        try:
+            results = plan.roll_many(len(waiting), do_sum)
+        except Exception as err:
+            for future in waiting:
+                if not future.done():
+                    future.set_exception(err)
+            return
+
+        # NumPy arrays hold NumPy integers, which json can not encode
+        if not isinstance(results, list):
+            results = results.tolist()
+        for future, result in zip(waiting, results):
+            # A client that disconnected may have cancelled its request
+            if not future.done():
+                future.set_result(result)
+
+
+def serve(host="127.0.0.1", port=8765, path=None):
+    """ Run a RollServer on host and port, or on the Unix socket at path,
+    until interrupted.
+
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    roll_server = RollServer()
+    server = loop.run_until_complete(roll_server.start(host, port, path))
+    for sock in server.sockets:
+        logging.info("Serving on %s", sock.getsockname())
+
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(roll_server.close())
+        loop.close()
+
+
+def serve_main():
+    # Command line parsing
+    parser = argparse.ArgumentParser(
+        prog="Dice Server",
+        description="Roll dice for clients sending line-delimited JSON requests.",
+    )
+    parser.add_argument("-v", "--version", action="version", version="%(prog)s 4.1.0")
+    parser.add_argument("--host", default="127.0.0.1", help="the address to listen on, defaults to 127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="the TCP port to listen on, defaults to 8765")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket at PATH instead of TCP")
+    parser.add_argument(
+        "--log",
+        help="set the logging level, defaults to WARNING",
+        dest="log_level",
+        default=logging.WARNING,
+        choices=[
+            'DEBUG',
+            'INFO',
+            'WARNING',
+            'ERROR',
+            'CRITICAL',
+        ],
+    )
+
+    args = parser.parse_args()
+
+    # Set the logging level based on the arguments
+    logging.basicConfig(level=args.log_level)
+
+    logging.debug("Arguments: %s", args)
+
+    serve(args.host, args.port, args.unix)
+
+
+if __name__ == '__main__':
+    serve_main()
@@ -25,7 +25,8 @@ setup(
     packages=find_packages(),
     entry_points={
         'console_scripts': [
-            'dice=dice.dice:main',
+            'dice=dice.cli:main',
+            'dice-server=dice.server:serve_main',
         ],
     },
     classifiers=[
@@ -44,6 +45,9 @@ setup(
     keywords=[
         "Dice notation",
     ],
+    extras_require={
+        'numpy': ['numpy'],
+    },
     setup_requires=['pytest-runner'],
     tests_require=['pytest'],
 )
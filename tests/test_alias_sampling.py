@@ -0,0 +1,122 @@
+import pytest
+
+import dice.dice
+from dice.dice import AliasTable, AliasTableCache, Dice, Distribution, compile
+
+
+def test_alias_table_columns():
+    dist = Distribution(3, (0.1, 0.2, 0.3, 0.4))
+    table = AliasTable(dist)
+    assert len(table) == 4
+
+    # Reconstruct each total's probability from the table
+    probabilities = [0.] * 4
+    for i, threshold in enumerate(table.threshold):
+        probabilities[i] += threshold / 4
+        probabilities[table.alias[i]] += (1 - threshold) / 4
+    assert probabilities == pytest.approx(dist.probabilities)
+
+
+class FixedRandom:
+    """ A generator that always returns the same float. """
+    def __init__(self, value):
+        self.value = value
+
+    def integers(self, low, high, size=None):
+        raise NotImplementedError
+
+    def random(self):
+        return self.value
+
+
+def test_alias_table_sample_edges():
+    table = AliasTable(Distribution(-2, (0.5, 0., 0.5)))
+    assert table.sample(FixedRandom(0.)) == -2
+    assert table.sample(FixedRandom(0.5)) == 0
+    for _ in range(100):
+        assert table.sample() in (-2, 0)
+
+
+def test_total_count():
+    TEST_PAIRS = (
+        ("3d6", 16),
+        ("4dF", 9),
+        ("4d6-L", 16),
+        ("5(d4-2)+3", 11),
+    )
+    for dice_str, answer in TEST_PAIRS:
+        d = Dice(dice_str)
+        assert d.plan.total_count() == answer
+        assert len(d.distribution()) == answer
+
+
+def test_total_count_matches_distribution():
+    for dice_str in ("3d6!2", "2d2!3-3", "4d6r5!", "5(d4-3)", "6d6=6", "2d2!2=2", "3d10-L>=8", "2(d6-5)"):
+        d = Dice(dice_str)
+        assert d.plan.total_count() == len(d.distribution())
+
+
+def test_huge_die_falls_back_without_its_distribution(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("The distribution of one die was built")
+
+    monkeypatch.setattr(dice.dice, "_die_distribution", fail)
+    monkeypatch.setattr(dice.dice, "_die_faces", fail)
+    d = Dice("3d3000000")
+    assert d.plan.total_count() == 3 * 2999999 + 1
+    for _ in range(10):
+        assert 3 <= d.sample_sum() <= 9000000
+    assert 190 <= Dice("200d3000000-10L").sample_sum()
+
+
+def test_sample_sum_range():
+    TESTS = (
+        ("500d10+3", 503, 5003),
+        ("4d6-L", 3, 18),
+        ("4(dF-1)", -8, 0),
+    )
+    for dice_str, low, high in TESTS:
+        d = Dice(dice_str)
+        for _ in range(200):
+            assert low <= d.sample_sum() <= high
+
+
+def test_sample_sum_falls_back(monkeypatch):
+    monkeypatch.setattr(dice.dice, "MAX_ALIAS_TABLE_SIZE", 10)
+    d = Dice("5d6")
+    for _ in range(100):
+        assert 5 <= d.sample_sum() <= 30
+
+
+def test_sample_sum_skips_costly_drop_pools(monkeypatch):
+    def fail(plan):
+        raise AssertionError("Alias table built for a costly pool")
+
+    monkeypatch.setattr(dice.dice, "_alias_table", fail)
+    TESTS = (
+        ("300d6-L", 299, 1794),
+        ("200d20-10L", 190, 3800),
+        ("1d6 + 300d6-L", 300, 1800),
+    )
+    for dice_str, low, high in TESTS:
+        assert low <= Dice(dice_str).sample_sum() <= high
+
+
+def test_alias_table_cache_budget():
+    cache = AliasTableCache(max_entries=40)
+    plans = [compile("{}d6".format(number)) for number in (1, 2, 3, 4)]
+    tables = [cache.table(plan) for plan in plans]
+    # 6 + 11 + 16 entries fit; adding 21 more evicts the two oldest tables
+    assert cache.entries == 37
+    assert len(cache) == 2
+    assert cache.table(plans[2]) is tables[2]
+    assert cache.table(plans[3]) is tables[3]
+    assert cache.table(plans[0]) is not tables[0]
+
+    # A table larger than the whole cache is built but not kept
+    cache.clear()
+    assert len(cache.table(compile("10d6"))) == 51
+    assert len(cache) == 0 and cache.entries == 0
+
+    with pytest.raises(ValueError):
+        AliasTableCache(max_entries=0)
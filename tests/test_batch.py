@@ -0,0 +1,41 @@
+import pytest
+
+from dice.dice import run_batch
+
+from io import StringIO
+
+
+def test_run_batch():
+    lines = ["3d6\n", "4dF\n", "2d6+3\n"]
+    output = StringIO()
+    errors = StringIO()
+    assert run_batch(lines, output, errors) == 0
+
+    results = output.getvalue().splitlines()
+    assert len(results) == 3
+    assert 5 <= int(results[2]) <= 15
+    assert errors.getvalue() == ""
+
+
+def test_run_batch_sum():
+    output = StringIO()
+    run_batch(["3d6"] * 5, output, StringIO(), do_sum=True, flush_every=2)
+    results = output.getvalue().splitlines()
+    assert len(results) == 5
+    assert all(3 <= int(result) <= 18 for result in results)
+
+
+def test_run_batch_bad_lines():
+    lines = ["3d6\n", "3$6\n", "1d6-L\n", "1d20\n"]
+    output = StringIO()
+    errors = StringIO()
+    assert run_batch(lines, output, errors) == 2
+
+    results = output.getvalue().split("\n")
+    assert results[1] == ""
+    assert results[2] == ""
+    assert results[3] != ""
+
+    reports = errors.getvalue().splitlines()
+    assert reports[0].startswith("line 2: '3$6': Illegal character '$'")
+    assert reports[1].startswith("line 3: '1d6-L': Number of dice dropped")
@@ -0,0 +1,86 @@
+import pytest
+
+import dice.dice
+from dice.dice import PARSE_CACHE, Dice, DistributionStore, PlanInterner, canonical, compile
+
+import gc
+
+
+NOTATIONS = (
+    "3d6",
+    "3(d6)",
+    "3d6+0",
+    "4d6-L",
+    "4d6-1l",
+    "4d6 - 1L",
+    "5(dF-1)+15-3L-H",
+    "5(dF-1)-H-3l+15",
+    "7(d20+1)-L-2H",
+    "3d6!",
+    "3d6!20",
+    "3(d6r2!5+1)",
+    "4d10r1",
+    "10d10>=8+1",
+    "10d10+1>=8",
+    "6d6-2L<3",
+    "2d6=6",
+    "3d6 + 2d8 - 1d4 + 5",
+    "-1d4+3d6",
+    "-2(d6-1)-L+3",
+    "1d6 - 3d6-2H + 4 - 1",
+    "10d10>=8 + 2d6",
+)
+
+
+def test_canonical_forms():
+    TEST_PAIRS = (
+        ("3d6", "3d6"),
+        ("3(d6)", "3d6"),
+        ("3d6+0", "3d6"),
+        ("4d6-L", "4d6-1L"),
+        ("4d6-1l", "4d6-1L"),
+        ("4d6 - 1L", "4d6-1L"),
+        ("5(dF-1)-H-3l+15", "5(dF-1)+15-1H-3L"),
+        ("3d6!", "3d6!{}".format(dice.dice.EXPLODE_CAP)),
+        ("3(d6r2!5+1)", "3(d6r2!5+1)"),
+        ("10d10>=8+1", "10d10+1>=8"),
+        ("3d6 + 2d8 - 1d4 + 5", "3d6+2d8-1d4+5"),
+        ("-2(d6-1)-L+3", "-2(d6-1)-1L+3"),
+        ("1d6 - 3d6-2H + 4 - 1", "1d6-3d6-2H+3"),
+    )
+    for dice_str, answer in TEST_PAIRS:
+        assert canonical(dice_str) == answer
+
+
+def test_canonical_round_trip():
+    for dice_str in NOTATIONS:
+        form = canonical(dice_str)
+        assert canonical(form) == form
+        assert compile(form) == compile(dice_str)
+
+
+def test_equivalent_notations_share_plan():
+    PARSE_CACHE.clear()
+    plans = [Dice(dice_str).plan for dice_str in ("4d6-L", "4d6-1l", "4d6 - 1L", "4(d6+0)-l")]
+    assert all(plan is plans[0] for plan in plans)
+    assert Dice("4d6-2L").plan is not plans[0]
+
+
+def test_interner_forgets_unused_plans():
+    interner = PlanInterner()
+    plan = compile("9d9-4L")
+    assert interner.intern(plan) is plan
+    assert interner.intern(compile("9d9-4l")) is plan
+    assert len(interner) == 1
+
+    del plan
+    PARSE_CACHE.clear()
+    gc.collect()
+    assert len(interner) == 0
+
+
+def test_store_shares_equivalent_notations(tmp_path):
+    store = DistributionStore(str(tmp_path))
+    Dice("4d6-L").distribution(store=store)
+    assert store.key(compile("4d6-1l")) == "4d6-1L"
+    assert store.get(compile("4(d6)-l")) is not None
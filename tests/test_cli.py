@@ -0,0 +1,121 @@
+import pytest
+
+from dice.cli import draw, main, parse_simple
+
+import os
+import random
+import subprocess
+import sys
+
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Modules the fast path must not import
+HEAVY_MODULES = ("dice.dice", "argparse", "asyncio", "enum", "logging", "numpy", "re")
+
+
+def test_parse_simple():
+    TEST_PAIRS = (
+        (["3d6"], (3, 6, False)),
+        (["-s", "10d20"], (10, 20, True)),
+        (["4d8", "--sum"], (4, 8, True)),
+        (["4d6-L"], None),
+        (["3(d6)"], None),
+        (["d6"], None),
+        (["3d"], None),
+        (["3dF"], None),
+        (["0d6"], None),
+        (["3d1"], None),
+        (["-s"], None),
+        (["-s", "-s", "3d6"], None),
+        (["3d6", "--log", "DEBUG"], None),
+        (["--batch"], None),
+        ([], None),
+    )
+    for argv, answer in TEST_PAIRS:
+        assert parse_simple(argv) == answer
+
+
+def test_fast_path_matches_dice(capsys):
+    from dice.dice import Dice
+
+    random.seed(5)
+    main(["7d12"])
+    random.seed(5)
+    assert capsys.readouterr().out == "{}\n".format(Dice("7d12").roll())
+
+    random.seed(5)
+    main(["-s", "7d12"])
+    random.seed(5)
+    assert capsys.readouterr().out == "{}\n".format(Dice("7d12").roll(True))
+
+
+def test_draw_matches_dice():
+    from dice.dice import Dice
+
+    for seed in range(20):
+        for number, size in ((1, 2), (3, 6), (50, 20), (7, 1000), (2, 2 ** 40)):
+            random.seed(seed)
+            values = draw(number, size)
+            random.seed(seed)
+            assert values == Dice("{}d{}".format(number, size)).roll()
+
+
+def test_falls_back_to_full_parser(capsys):
+    random.seed(9)
+    main(["-s", "4d6-L+2"])
+    total = int(capsys.readouterr().out)
+    assert 5 <= total <= 20
+
+
+def import_times(code):
+    """ Run code in a fresh interpreter with `-X importtime` and return its
+    output, and a dictionary of the cumulative import time in microseconds of
+    every module it imported, and whether it was imported at the top level.
+
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+    imported = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            top_level = not name[1:].startswith(" ")
+            imported[name.strip()] = (int(cumulative), top_level)
+
+    return result.stdout, imported
+
+
+def added_time(imported, baseline):
+    """ Return the time spent importing the top level modules that are not
+    in baseline.
+
+    """
+    return sum(time for name, (time, top_level) in imported.items() if top_level and name not in baseline)
+
+
+def test_fast_path_startup():
+    # Run the console script's fast path in a fresh interpreter and check,
+    # with the import time report, what it had to import beyond what the
+    # interpreter imports on its own (site and .pth files may load more).
+    _, baseline = import_times("pass")
+    output, fast = import_times("from dice.cli import main; main(['3d6'])")
+    assert len(output.strip("[]\n").split(",")) == 3
+
+    assert "dice.cli" in fast
+    for module in HEAVY_MODULES:
+        assert module in baseline or module not in fast
+
+    # Compare with importing the full module on the same machine, rather
+    # than with a fixed time
+    _, full = import_times("import dice.dice")
+    assert added_time(fast, baseline) < added_time(full, baseline) / 5
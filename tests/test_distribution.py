@@ -0,0 +1,139 @@
+import pytest
+
+import dice.dice
+from dice.dice import Dice
+
+from itertools import product
+from collections import Counter
+
+
+def brute_force(number, faces, global_mod=0, lowest_mod=0, highest_mod=0):
+    """ Enumerate every outcome to get the exact distribution. """
+    counts = Counter(
+        sum(sorted(roll)[lowest_mod:number - highest_mod]) + global_mod
+        for roll in product(faces, repeat=number)
+    )
+    total = len(faces) ** number
+    return {value: count / total for value, count in counts.items()}
+
+
+def assert_pmf_close(pmf, answer):
+    assert set(pmf) == set(answer)
+    for value, p in answer.items():
+        assert pmf[value] == pytest.approx(p)
+
+
+def test_distribution_matches_brute_force():
+    TESTS = (
+        ("1d6", 1, range(1, 7), 0),
+        ("3d6", 3, range(1, 7), 0),
+        ("4dF", 4, (-1, 0, 1), 0),
+        ("3d7+4", 3, range(1, 8), 4),
+        ("3(d6+1)", 3, range(2, 8), 0),
+        ("3(d6-2)", 3, (0, 0, 1, 2, 3, 4), 0),
+        ("2(dF-1)-3", 2, (-2, -1, 0), -3),
+    )
+    for dice_str, number, faces, global_mod in TESTS:
+        pmf = Dice(dice_str).distribution().pmf()
+        assert_pmf_close(pmf, brute_force(number, faces, global_mod))
+
+
+def test_distribution_statistics():
+    dist = Dice("2d6").distribution()
+    assert dist.minimum == 2
+    assert dist.maximum == 12
+    assert dist.mean() == pytest.approx(7)
+    assert dist.variance() == pytest.approx(35 / 6)
+    assert dist.probability(7) == pytest.approx(6 / 36)
+    assert dist.probability(1) == 0
+    assert dist.at_least(10) == pytest.approx(6 / 36)
+    assert dist.at_least(2) == pytest.approx(1)
+    assert dist.at_most(3) == pytest.approx(3 / 36)
+    assert dist.percentile(50) == 7
+    assert dist.percentile(0) == 2
+    assert dist.percentile(100) == 12
+
+
+def test_distribution_bad_percentile():
+    with pytest.raises(ValueError) as err_info:
+        Dice("2d6").distribution().percentile(101)
+    assert err_info.match(r"Percentile 101 is not between 0 and 100.")
+
+
+def test_distribution_sums_to_one():
+    for dice_str in ("20d6", "5dF", "8(d4-1)+2"):
+        assert sum(Dice(dice_str).distribution().probabilities) == pytest.approx(1)
+
+
+def test_drop_distribution_matches_brute_force():
+    TESTS = (
+        ("4d6-L", 4, range(1, 7), 0, 1, 0),
+        ("4d6-h", 4, range(1, 7), 0, 0, 1),
+        ("6d3-2L-3H", 6, range(1, 4), 0, 2, 3),
+        ("5(d4-2)-L-2H", 5, (0, 0, 1, 2), 0, 1, 2),
+        ("4(dF+1)+3-H", 4, (0, 1, 2), 3, 0, 1),
+        ("5(d6+1)-2-2L", 5, range(2, 8), -2, 2, 0),
+    )
+    for dice_str, number, faces, global_mod, lowest_mod, highest_mod in TESTS:
+        pmf = Dice(dice_str).distribution().pmf()
+        assert_pmf_close(pmf, brute_force(number, faces, global_mod, lowest_mod, highest_mod))
+
+
+def test_drop_distribution_large_pool():
+    dist = Dice("20d20-5L-5H").distribution()
+    assert dist.minimum == 10
+    assert dist.maximum == 200
+    assert sum(dist.probabilities) == pytest.approx(1)
+    # Dropping the same number from both ends keeps the distribution symmetric
+    assert dist.mean() == pytest.approx(105)
+
+
+def test_convolution_backends_agree():
+    BACKENDS = ["direct", "squaring"]
+    if dice.dice._numpy() is not None:
+        BACKENDS.append("fft")
+
+    for dice_str in ("1d6", "3d6", "13d8+2", "9(dF+1)", "7(d6-3)"):
+        d = Dice(dice_str)
+        answer = d.distribution("direct")
+        for backend in BACKENDS:
+            dist = d.distribution(backend)
+            assert dist.minimum == answer.minimum
+            assert dist.probabilities == pytest.approx(answer.probabilities, abs=1e-12)
+
+
+def test_choose_backend():
+    assert dice.dice._choose_backend(3, 6) == "direct"
+    assert dice.dice._choose_backend(20, 6) == "squaring"
+    if dice.dice._numpy() is not None:
+        assert dice.dice._choose_backend(1000, 100) == "fft"
+
+
+def test_fft_large_pool():
+    pytest.importorskip("numpy")
+    dist = Dice("5000d6").distribution()
+    assert dist.minimum == 5000
+    assert dist.maximum == 30000
+    assert sum(dist.probabilities) == pytest.approx(1)
+    assert dist.mean() == pytest.approx(17500)
+    assert dist.variance() == pytest.approx(5000 * 35 / 12)
+
+
+def test_fft_requires_numpy(monkeypatch):
+    monkeypatch.setattr(dice.dice, "numpy", None)
+    with pytest.raises(ImportError):
+        Dice("4d7").distribution("fft")
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError) as err_info:
+        Dice("3d6").distribution("magic")
+    assert err_info.match(r"Unknown convolution backend 'magic'.")
+
+
+def test_distribution_shift():
+    dist = Dice("2d6").distribution()
+    shifted = dist.shift(-3)
+    assert (shifted.minimum, shifted.maximum) == (-1, 9)
+    assert shifted.probabilities == dist.probabilities
+    assert Dice("2d6-3").distribution().pmf() == shifted.pmf()
@@ -0,0 +1,92 @@
+import pytest
+
+import dice.dice
+from dice.dice import Dice, DistributionStore, RollPlan, compile
+
+import mmap
+import os
+
+
+def test_store_round_trip(tmp_path):
+    store = DistributionStore(str(tmp_path))
+    plan = compile("20d20-3L")
+    assert store.get(plan) is None
+
+    distribution = plan.distribution()
+    store.put(plan, distribution)
+    stored = store.get(plan)
+
+    assert stored.minimum == distribution.minimum
+    assert stored.maximum == distribution.maximum
+    assert list(stored.probabilities) == list(distribution.probabilities)
+    assert stored.mean() == pytest.approx(distribution.mean())
+    assert stored.percentile(50) == distribution.percentile(50)
+    assert stored.negate().maximum == -distribution.minimum
+    assert stored.add(stored).mean() == pytest.approx(2 * distribution.mean())
+
+
+def test_store_reads_are_zero_copy(tmp_path):
+    store = DistributionStore(str(tmp_path))
+    plan = compile("4d6-L")
+    stored = store.distribution(plan)
+
+    assert isinstance(stored.probabilities, memoryview)
+    assert isinstance(stored.probabilities.obj, mmap.mmap)
+    assert stored.probabilities.readonly
+
+
+def test_store_computes_once(tmp_path, monkeypatch):
+    calls = []
+    original = RollPlan.distribution
+
+    def counting(plan, backend=None):
+        calls.append(plan)
+        return original(plan, backend)
+
+    monkeypatch.setattr(RollPlan, "distribution", counting)
+
+    d = Dice("10d6+2")
+    first = d.distribution(store=DistributionStore(str(tmp_path)))
+    # A new store on the same directory, like a restarted worker
+    second = d.distribution(store=DistributionStore(str(tmp_path)))
+    assert len(calls) == 1
+    assert first.pmf() == second.pmf()
+
+    # Different plans get different entries
+    other = Dice("10d6+3").distribution(store=DistributionStore(str(tmp_path)))
+    assert len(calls) == 2
+    assert other.minimum == first.minimum + 1
+
+
+def test_store_invalidated_by_version(tmp_path, monkeypatch):
+    store = DistributionStore(str(tmp_path))
+    plan = compile("3d6")
+    store.put(plan, plan.distribution())
+    assert store.get(plan) is not None
+
+    monkeypatch.setattr(dice.dice, "ROLL_SEMANTICS_VERSION", dice.dice.ROLL_SEMANTICS_VERSION + 1)
+    assert store.get(plan) is None
+
+    # Storing again replaces the stale entry
+    store.distribution(plan)
+    assert store.get(plan) is not None
+    assert len(os.listdir(str(tmp_path))) == 1
+
+
+def test_store_ignores_bad_files(tmp_path):
+    store = DistributionStore(str(tmp_path))
+    plan = compile("3d6")
+    path = store.path(store.key(plan))
+
+    for contents in (b"", b"not a distribution", b"DICEPMF\0" + b"\0" * 100):
+        with open(path, "wb") as pmf_file:
+            pmf_file.write(contents)
+        assert store.get(plan) is None
+
+    # A truncated entry is also ignored
+    store.put(plan, plan.distribution())
+    with open(path, "rb") as pmf_file:
+        contents = pmf_file.read()
+    with open(path, "wb") as pmf_file:
+        pmf_file.write(contents[:-8])
+    assert store.get(plan) is None
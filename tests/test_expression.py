@@ -0,0 +1,98 @@
+import pytest
+
+import dice.dice
+from dice.dice import Dice, ExpressionPlan, RollPlan, compile, split_expression
+
+import pickle
+
+
+def test_split_expression():
+    TEST_PAIRS = (
+        (("3", "d6"), ([(1, ("3", "d6"))], 0)),
+        (("3", "d6", "+2"), ([(1, ("3", "d6"))], 2)),
+        (("3", "(", "d6", "+1", ")"), ([(1, ("3", "(", "d6", "+1", ")"))], 0)),
+        (
+            ("3", "d6", "+2", "d8", "-1", "d4", "+5"),
+            ([(1, ("3", "d6")), (1, ("2", "d8")), (-1, ("1", "d4"))], 5),
+        ),
+        (
+            ("-2", "(", "d6", "-1", ")", "-L", "+3", "-1"),
+            ([(-1, ("2", "(", "d6", "-1", ")", "-L"))], 2),
+        ),
+    )
+    for tokens, answer in TEST_PAIRS:
+        assert split_expression(tokens) == answer
+
+
+def test_single_term_stays_roll_plan():
+    TEST_PAIRS = (
+        ("3d6", (3, 6, 0, 0, 0, 0)),
+        ("3d6 + 5", (3, 6, 0, 5, 0, 0)),
+        ("8d6-2L+4", (8, 6, 0, 4, 0, 2)),
+        ("4d6 + 1 - 3 - L", (4, 6, 0, -2, 0, 1)),
+    )
+    for dice_str, answer in TEST_PAIRS:
+        plan = compile(dice_str)
+        assert isinstance(plan, RollPlan)
+        assert plan.values() == answer
+
+
+def test_expression_plan():
+    plan = compile("3d6 + 2d8 - 1d4 + 5")
+    assert isinstance(plan, ExpressionPlan)
+    assert plan.constant == 5
+    assert [(sign, term.values()) for sign, term in plan.terms] == [
+        (1, (3, 6, 0, 0, 0, 0)),
+        (1, (2, 8, 0, 0, 0, 0)),
+        (-1, (1, 4, 0, 0, 0, 0)),
+    ]
+    assert pickle.loads(pickle.dumps(plan)) == plan
+    with pytest.raises(AttributeError):
+        plan.constant = 3
+
+
+def test_expression_rolls():
+    d = Dice("3d6 + 2d8 - 1d4 + 5", rng=3)
+    for _ in range(200):
+        assert 3 + 2 - 4 + 5 <= d.roll() <= 18 + 16 - 1 + 5
+    rolls = d.roll_many(200)
+    assert len(rolls) == 200
+    assert all(6 <= roll <= 38 for roll in rolls)
+    assert 6 <= d.sample_sum() <= 38
+
+    d = Dice("-1d4", rng=3)
+    assert all(-4 <= d.roll() <= -1 for _ in range(100))
+
+
+def test_expression_rolls_without_numpy(monkeypatch):
+    monkeypatch.setattr(dice.dice, "numpy", None)
+    rolls = Dice("2d6 - 1(d4+1)", rng=1).roll_many(100)
+    assert all(2 - 5 <= roll <= 12 - 2 for roll in rolls)
+
+
+def test_expression_distribution():
+    dist = Dice("1d6 - 1d6 + 2").distribution()
+    assert dist.minimum == -3
+    assert dist.maximum == 7
+    assert dist.probability(2) == pytest.approx(6 / 36)
+    assert dist.mean() == pytest.approx(2)
+
+    dist = Dice("3d6 + 2d8 - 1d4 + 5").distribution()
+    assert dist.mean() == pytest.approx(10.5 + 9 - 2.5 + 5)
+    assert dist.variance() == pytest.approx(3 * 35 / 12 + 2 * 63 / 12 + 15 / 12)
+    assert len(dist) == compile("3d6 + 2d8 - 1d4 + 5").total_count()
+
+
+def test_expression_errors():
+    with pytest.raises(ValueError) as err_info:
+        Dice("+5")
+    assert err_info.match(r"No dice found in dice format string '\+5'.")
+
+    with pytest.raises(ValueError):
+        Dice("3d6 + 1d6-L")
+
+    # Whitespace only separates terms, so it can not join or split numbers
+    for dice_str in ("3d6 2", "1 0d6"):
+        with pytest.raises(ValueError) as err_info:
+            Dice(dice_str)
+        assert err_info.match(r"Illegal character ' ' found in dice format string!")
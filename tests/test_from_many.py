@@ -0,0 +1,55 @@
+import pytest
+
+from dice.dice import PARSE_CACHE, Dice, instrument
+
+
+def test_from_many_aligned():
+    notations = ["3d6", "4d6-L", "3d1", " 3d6", "4d6-l", "", "3d6+2d8", "3d1", "2d%"]
+    dice, errors = Dice.from_many(notations)
+
+    assert len(dice) == len(notations)
+    assert set(errors) == {2, 5, 7, 8}
+    for i, d in enumerate(dice):
+        if i in errors:
+            assert d is None
+        else:
+            assert d.plan == Dice(notations[i]).plan
+
+    assert str(errors[2]) == "Die size of 1 is less than 2."
+    assert errors[7] is errors[2]
+    assert str(errors[5]) == "No dice found in dice format string ''."
+    assert isinstance(errors[8], ValueError)
+
+
+def test_from_many_reuses_dice():
+    dice, errors = Dice.from_many(["3d6", " 3d6", "3d6", "4d6-L", "4d6-l"])
+    assert not errors
+    assert [d.dice_str for d in dice] == ["3d6", " 3d6", "3d6", "4d6-L", "4d6-l"]
+    assert dice[0] is not dice[2]
+    assert dice[0].plan is dice[1].plan is dice[2].plan
+    assert dice[3].plan is dice[4].plan
+    assert dice[0].plan is not dice[3].plan
+
+
+def test_from_many_parses_each_notation_once():
+    PARSE_CACHE.clear()
+    with instrument() as stats:
+        dice, errors = Dice.from_many(["4d6-L", "3d6 + 2d8"] * 50 + ["3d1"] * 10)
+    counts = stats.as_dict()["stages"]
+    assert counts["cache_lookup"]["count"] == 3
+    assert counts["tokenize"]["count"] == 3
+    # Both terms of the expression are parsed
+    assert counts["parse"]["count"] == 4
+    assert len(errors) == 10
+
+    # Valid notations are cached for later batches
+    with instrument() as stats:
+        Dice.from_many(["4d6-L"])
+    assert stats.as_dict()["stages"]["parse"]["count"] == 0
+
+
+def test_from_many_shares_options():
+    dice, _ = Dice.from_many(["3d6", "2d20"], rng=7, trace=False)
+    assert dice[0].rng is dice[1].rng
+    assert not dice[0].trace
+    assert Dice.from_many([]) == ([], {})
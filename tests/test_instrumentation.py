@@ -0,0 +1,74 @@
+import pytest
+
+import dice.dice
+from dice.dice import PARSE_CACHE, Dice, Instrumentation, instrument
+
+
+def test_disabled_by_default():
+    assert dice.dice.INSTRUMENTATION is None
+    Dice("3d6").roll()
+    assert dice.dice.INSTRUMENTATION is None
+
+
+def test_instrument_records_stages():
+    PARSE_CACHE.clear()
+    with instrument() as stats:
+        assert dice.dice.INSTRUMENTATION is stats
+        d = Dice("4d6-L")
+        Dice("4d6-L")
+        Dice("3d6 + 2dF")
+        d.roll()
+        d.roll_many(10)
+    assert dice.dice.INSTRUMENTATION is None
+
+    data = stats.as_dict()
+    stages = data["stages"]
+    assert stages["cache_lookup"]["count"] == 3
+    assert stages["tokenize"]["count"] == 3
+    assert stages["parse"]["count"] == 3
+    assert stages["validate"]["count"] == 3
+    assert stages["roll"]["count"] == 2
+    assert all(values["nanoseconds"] >= 0 for values in stages.values())
+
+    assert data["die_counts"] == {4: 11}
+    assert data["die_sizes"] == {6: 11}
+
+    # Nothing is recorded once the block is over
+    d.roll()
+    assert stats.as_dict() == data
+
+
+def test_instrument_nests():
+    outer = Instrumentation()
+    with instrument(outer):
+        with instrument() as inner:
+            Dice("3d6 + 2dF").roll()
+        assert dice.dice.INSTRUMENTATION is outer
+        Dice("1d20").roll()
+
+    assert inner.as_dict()["die_sizes"] == {6: 1, 3: 1}
+    assert outer.as_dict()["die_sizes"] == {20: 1}
+
+    outer.reset()
+    assert outer.as_dict()["die_sizes"] == {}
+
+
+def test_prometheus_export():
+    stats = Instrumentation()
+    with instrument(stats):
+        Dice("3d6").roll_many(5)
+        Dice("40d10").roll()
+
+    text = stats.prometheus()
+    lines = text.splitlines()
+    assert text.endswith("\n")
+    assert "# TYPE dice_stage_calls_total counter" in lines
+    assert 'dice_stage_calls_total{stage="roll"} 2' in lines
+    assert "# TYPE dice_die_count histogram" in lines
+    assert 'dice_die_count_bucket{le="2"} 0' in lines
+    assert 'dice_die_count_bucket{le="4"} 5' in lines
+    assert 'dice_die_count_bucket{le="64"} 6' in lines
+    assert 'dice_die_count_bucket{le="+Inf"} 6' in lines
+    assert "dice_die_count_sum 55" in lines
+    assert "dice_die_count_count 6" in lines
+    assert 'dice_die_size_bucket{le="6"} 5' in lines
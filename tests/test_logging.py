@@ -0,0 +1,44 @@
+import pytest
+
+from dice.dice import Dice, DiceTokenizer
+
+import logging
+
+
+def fail(*args, **kwargs):
+    raise AssertionError("Logging call made on the fast path")
+
+
+def test_fast_path_makes_no_logging_calls(monkeypatch, caplog):
+    # caplog puts the root level back when the test ends
+    caplog.set_level(logging.WARNING)
+    d = Dice("7(d20-1)-L-2H", trace=None)
+    assert not d.trace
+
+    monkeypatch.setattr(logging, "debug", fail)
+    monkeypatch.setattr(logging, "info", fail)
+    for _ in range(10):
+        d.roll()
+        d.roll(do_sum=True)
+    tuple(DiceTokenizer("5(d10-1)+15-3L-H"))
+    Dice("5(d10-1)+15-3L-H", rng=1).roll()
+
+
+def test_fast_path_matches_trace_path():
+    for dice_str in ("3d6", "4(dF-1)-L", "5(d4-3)+2-H", "7(d20+1)-L-2H"):
+        fast = Dice(dice_str, rng=5, trace=False)
+        traced = Dice(dice_str, rng=5, trace=True)
+        assert [fast.roll() for _ in range(20)] == [traced.roll() for _ in range(20)]
+
+
+def test_trace_mode_logs_each_die(caplog):
+    d = Dice("3d6", trace=True)
+    with caplog.at_level(logging.DEBUG):
+        d.roll()
+    assert sum("Roll value is" in message for message in caplog.messages) >= 3
+
+
+def test_trace_selected_from_log_level(caplog):
+    with caplog.at_level(logging.DEBUG):
+        assert Dice("3d6").trace
+    assert not Dice("3d6").trace
@@ -0,0 +1,156 @@
+import pytest
+
+import dice.dice
+from dice.dice import Dice, DiceTokenizer, RollPlan, compile
+
+from itertools import product
+from collections import Counter
+import pickle
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request, monkeypatch):
+    """ Run the test with NumPy, and again as if NumPy were not installed. """
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(dice.dice, "numpy", None)
+    return request.param
+
+
+def test_tokenize_modifiers():
+    TEST_PAIRS = (
+        ("3d6!", ("3", "d6", "!")),
+        ("3d6!3", ("3", "d6", "!3")),
+        ("4d10r1", ("4", "d10", "r1")),
+        ("10d10>=8", ("10", "d10", ">=8")),
+        ("3(d6r2!+1)-L<3", ("3", "(", "d6", "r2", "!", "+1", ")", "-L", "<3")),
+        ("2d6=6", ("2", "d6", "=6")),
+    )
+    for dice_str, answer in TEST_PAIRS:
+        assert DiceTokenizer.tokenize(dice_str) == answer
+
+
+def test_parse_modifiers():
+    TEST_PAIRS = (
+        ("3d6", (0, 0, None)),
+        ("3d6!", (0, dice.dice.EXPLODE_CAP, None)),
+        ("3d6!3", (0, 3, None)),
+        ("4d10r1", (1, 0, None)),
+        ("3(d6r2!5+1)", (2, 5, None)),
+        ("10d10>=8", (0, 0, (">=", 8))),
+        ("5d10!-L<3+2", (0, dice.dice.EXPLODE_CAP, ("<", 3))),
+    )
+    for dice_str, answer in TEST_PAIRS:
+        assert compile(dice_str).modifiers() == answer
+
+
+def test_success_counting_sums():
+    plan = compile("10d10>=8")
+    assert plan.do_sum
+    assert 0 <= plan.roll() <= 10
+
+
+def test_bad_modifiers():
+    TEST_PAIRS = (
+        ("3d6r6", r"Reroll of 6 or less leaves no faces on a die of size 6."),
+        ("3dF!", r"Fate dice cannot be rerolled or exploded."),
+        ("3dFr1", r"Fate dice cannot be rerolled or exploded."),
+        ("3d6!0", r"Explosion cap 0 is less than 1."),
+        ("3d6!101", r"Explosion cap 101 is greater than 100."),
+    )
+    for dice_str, match in TEST_PAIRS:
+        with pytest.raises(ValueError) as err_info:
+            Dice(dice_str)
+        assert err_info.match(match)
+
+    for dice_str in ("3d6>", "3d6>=", "3d6r", "3d6>=8!", "3d6>=8-L"):
+        with pytest.raises(RuntimeError):
+            Dice(dice_str)
+
+
+def test_rolls_respect_modifiers(backend):
+    # Rerolled faces never show up
+    plan = compile("20d6r2")
+    assert min(plan.roll()) >= 3
+    assert min(min(row) for row in plan.roll_many(50)) >= 3
+
+    # An explosion can add at most cap rolls of the die
+    plan = compile("50d2!3")
+    for row in plan.roll_many(20):
+        assert all(1 <= value <= 8 for value in row)
+    assert max(plan.roll()) <= 8
+
+    # Successes are counted, with the global mod added
+    totals = compile("10d10>=8+1").roll_many(50)
+    assert all(1 <= total <= 11 for total in totals)
+
+
+def test_trace_roll_matches_roll():
+    plan = compile("6d6r1!2-L>=5")
+    for seed in range(20):
+        assert plan.trace_roll(rng=seed) == plan.roll(rng=seed)
+
+
+def test_exploding_distribution():
+    # Each extra roll adds another 1d2, and the tail is truncated at the cap
+    pmf = Dice("1d2!2").distribution().pmf()
+    answer = {1: 1 / 2, 3: 1 / 4, 5: 1 / 8, 6: 1 / 8}
+    assert set(pmf) == set(answer)
+    for value, p in answer.items():
+        assert pmf[value] == pytest.approx(p)
+
+    # With a high cap the mean is close to the uncapped size * (size + 1) / (2 * (size - 1))
+    assert Dice("3d6!").distribution().mean() == pytest.approx(3 * 4.2)
+
+
+def test_modifier_distributions_match_brute_force():
+    # The faces of one die, with their weights out of the total
+    TESTS = (
+        ("3d6r2", 3, {face: 1 for face in range(3, 7)}, None, 0),
+        ("3d3!2-L", 3, {1: 9, 2: 9, 4: 3, 5: 3, 7: 1, 8: 1, 9: 1}, None, 1),
+        ("4d6>=5", 4, {face: 1 for face in range(1, 7)}, (">=", 5), 0),
+        ("4d6r1-L=6", 4, {face: 1 for face in range(2, 7)}, ("=", 6), 1),
+    )
+    for dice_str, number, weights, success, lowest_mod in TESTS:
+        total = sum(weights.values()) ** number
+        counts = Counter()
+        for roll in product(weights, repeat=number):
+            kept = sorted(roll)[lowest_mod:]
+            if success is not None:
+                compare = dice.dice.COMPARISONS[success[0]]
+                kept = [1 if compare(value, success[1]) else 0 for value in kept]
+            weight = 1
+            for value in roll:
+                weight *= weights[value]
+            counts[sum(kept)] += weight
+
+        pmf = Dice(dice_str).distribution().pmf()
+        assert set(pmf) == set(counts)
+        for value, count in counts.items():
+            assert pmf[value] == pytest.approx(count / total)
+
+
+def test_plan_with_modifiers_pickles():
+    plan = compile("3(d6r1!4+1)-L>=4")
+    assert pickle.loads(pickle.dumps(plan)) == plan
+    assert plan != RollPlan(*plan.values())
+
+
+def test_explosion_tail_underflow():
+    # The far end of a long explosion tail is too unlikely to be a float, so
+    # it is left out rather than listed with a weight of 0
+    faces = dice.dice._die_faces(2000, 0, 0, 100)
+    assert all(p > 0. for _, p in faces)
+    assert sum(p for _, p in faces) == pytest.approx(1.)
+    assert faces[-1][0] < 2000 * 101
+    assert Dice("2d2000!100").plan.total_count() == len(Dice("2d2000!100").distribution())
+
+
+def test_costly_drop_distribution():
+    with pytest.raises(ValueError) as err_info:
+        Dice("50d6!-L").distribution()
+    assert err_info.match(r"Exact distribution of '50d6!20-1L' is too costly")
+
+    # Sampling still works, by rolling the dice
+    assert 49 <= Dice("50d6!-L").sample_sum()
@@ -0,0 +1,65 @@
+import pytest
+
+from dice.dice import Dice, ParseCache, PARSE_CACHE
+
+
+def test_cache_hit_matches_parse():
+    TESTS = (
+        "3d6",
+        "4dF",
+        "10d7+4",
+        "7(d20+1)-L-2H",
+        "5(d10-1)+15-3L-H",
+    )
+    PARSE_CACHE.clear()
+    for dice_str in TESTS:
+        first = Dice(dice_str)
+        second = Dice(dice_str)
+        for attr in ("number", "size", "local_mod", "global_mod", "highest_mod", "lowest_mod", "do_sum"):
+            assert getattr(first, attr) == getattr(second, attr)
+
+    info = PARSE_CACHE.info()
+    assert info["misses"] == len(TESTS)
+    assert info["hits"] == len(TESTS)
+
+
+def test_cache_normalizes_drop_case():
+    PARSE_CACHE.clear()
+    Dice("4d6-L")
+    Dice("4d6-l")
+    assert PARSE_CACHE.info()["hits"] == 1
+
+
+def test_cache_key_ignores_separating_whitespace():
+    PARSE_CACHE.clear()
+    Dice("3d6+2d8-1")
+    Dice(" 3d6 + 2d8 - 1 ")
+    assert PARSE_CACHE.info()["hits"] == 1
+    assert ParseCache.normalize(("4", "d6", "-L")) == "4d6-l"
+
+
+def test_cache_does_not_store_invalid_dice():
+    PARSE_CACHE.clear()
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            Dice("1d6-L")
+    assert len(PARSE_CACHE) == 0
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ParseCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.info() == {"hits": 3, "misses": 1, "evictions": 1, "size": 2, "maxsize": 2}
+
+
+def test_cache_size_too_small():
+    with pytest.raises(ValueError) as err_info:
+        ParseCache(maxsize=0)
+    assert err_info.match(r"Cache size 0 is less than 1.")
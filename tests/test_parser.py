@@ -0,0 +1,90 @@
+import pytest
+
+from dice.dice import BNF, Dice, DiceTable, Grammar, LLParser, StackToken
+
+
+def test_grammar_sets():
+    grammar = Grammar(BNF, DiceTable())
+    assert grammar.start == StackToken.start
+    assert set(grammar.productions) == {
+        StackToken.start,
+        StackToken.die_type,
+        StackToken.die_mod,
+        StackToken.drop_mod,
+        StackToken.success_mod,
+    }
+    assert grammar.optional == {StackToken.local_mod, StackToken.global_mod}
+    assert grammar.nullable == {StackToken.die_mod, StackToken.drop_mod, StackToken.success_mod}
+
+    assert grammar.first[StackToken.start] == {StackToken.die_num}
+    assert grammar.first[StackToken.die_type] == {StackToken.die_size, "("}
+    assert grammar.first[StackToken.die_mod] == {StackToken.reroll, StackToken.explode}
+    assert grammar.first[StackToken.drop_mod] == {StackToken.drop_high, StackToken.drop_low}
+
+    assert grammar.follow[StackToken.start] == {Grammar.END}
+    assert grammar.follow[StackToken.drop_mod] == {StackToken.success, Grammar.END}
+    assert grammar.follow[StackToken.die_type] == {
+        StackToken.global_mod,
+        StackToken.drop_high,
+        StackToken.drop_low,
+        StackToken.success,
+        Grammar.END,
+    }
+
+
+def test_grammar_table():
+    grammar = Grammar(BNF, DiceTable())
+    row = grammar.table[StackToken.die_type]
+    assert row["("] == ("(", StackToken.die_size, StackToken.die_mod, StackToken.local_mod, ")")
+    assert row[StackToken.die_size] == (StackToken.die_size, StackToken.die_mod)
+    assert grammar.table[StackToken.drop_mod][Grammar.END] == ()
+
+
+def test_grammar_conflict():
+    bnf = """
+    StackToken.start ::= StackToken.die_num | StackToken.die_num StackToken.die_type
+    StackToken.die_type ::= StackToken.die_size
+    """
+    with pytest.raises(RuntimeError) as err_info:
+        Grammar(bnf, DiceTable())
+    assert err_info.match(r"Grammar is not LL\(1\)")
+
+
+def test_grammar_is_cached():
+    assert LLParser.get_grammar(DiceTable()) is LLParser.get_grammar(DiceTable())
+
+
+def test_optional_parts():
+    TEST_PAIRS = (
+        ("3d6", (3, 6, 0, 0, 0, 0)),
+        ("3(d6)", (3, 6, 0, 0, 0, 0)),
+        ("3d6-L", (3, 6, 0, 0, 0, 1)),
+        ("3d6+2", (3, 6, 0, 2, 0, 0)),
+        ("5(dF-1)+15-3L-H", (5, "F", -1, 15, 1, 3)),
+    )
+    for dice_str, answer in TEST_PAIRS:
+        assert Dice(dice_str).plan.values() == answer
+
+
+def test_rejects_bad_strings():
+    TESTS = (
+        "3",
+        "d6",
+        "3d6d6",
+        "3d6)",
+        "3(d6",
+        "3(d6+1",
+        "3d6-L(",
+    )
+    for dice_str in TESTS:
+        with pytest.raises(RuntimeError):
+            Dice(dice_str)
+
+    # Strings without any dice are rejected while checking the expression
+    with pytest.raises(ValueError) as err_info:
+        Dice("")
+    assert err_info.match(r"No dice found in dice format string ''.")
+
+
+def test_constants_are_summed():
+    assert Dice("3d6+1+2").plan.values() == (3, 6, 0, 3, 0, 0)
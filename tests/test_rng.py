@@ -0,0 +1,98 @@
+import pytest
+
+import dice.dice
+from dice.dice import Dice, RandomStream, as_rng, spawn_rngs
+
+import random
+
+
+class CountingRNG:
+    """ A custom generator that only provides the bulk interface. """
+    def __init__(self):
+        self.calls = 0
+        self.stream = RandomStream(0)
+
+    def integers(self, low, high, size=None):
+        self.calls += 1
+        return self.stream.integers(low, high, size)
+
+
+def test_random_stream_integers():
+    stream = RandomStream(1234)
+    assert 1 <= stream.integers(1, 7) <= 6
+    values = stream.integers(-1, 2, 50)
+    assert len(values) == 50
+    assert set(values) <= {-1, 0, 1}
+    rows = stream.integers(1, 4, size=(3, 5))
+    assert len(rows) == 3
+    assert all(len(row) == 5 for row in rows)
+
+
+def test_as_rng():
+    assert as_rng(None) is dice.dice.GLOBAL_STREAM
+    assert isinstance(as_rng(5), RandomStream)
+    assert isinstance(as_rng(random.Random(5)), RandomStream)
+    custom = CountingRNG()
+    assert as_rng(custom) is custom
+    with pytest.raises(TypeError):
+        as_rng("not a generator")
+
+
+def test_seeded_rolls_are_reproducible():
+    for dice_str in ("10d6", "7(d20+1)-L-2H", "4dF+2"):
+        first = Dice(dice_str, rng=random.Random(42))
+        second = Dice(dice_str, rng=random.Random(42))
+        assert [first.roll() for _ in range(20)] == [second.roll() for _ in range(20)]
+        assert first.roll_many(20, do_sum=True) == pytest.approx(second.roll_many(20, do_sum=True))
+        assert first.sample_sum() == second.sample_sum()
+
+
+def test_numpy_generator():
+    numpy = pytest.importorskip("numpy")
+    first = Dice("7(d20+1)-L-2H", rng=numpy.random.default_rng(7))
+    second = Dice("7(d20+1)-L-2H", rng=numpy.random.default_rng(7))
+    assert first.roll() == second.roll()
+    assert (first.roll_many(50) == second.roll_many(50)).all()
+
+
+def test_one_bulk_draw_per_roll():
+    rng = CountingRNG()
+    d = Dice("50d6-L", rng=rng)
+    d.roll()
+    assert rng.calls == 1
+
+
+def test_integers_only_rng():
+    rng = CountingRNG()
+    assert not hasattr(rng, "random")
+    for dice_str, low, high in (("50d6-L", 49, 294), ("3d6 + 2d8 - 1", 4, 33), ("6d6!2r1", 12, 108)):
+        d = Dice(dice_str, rng=rng)
+        assert low <= d.roll(do_sum=True) <= high
+        assert all(low <= total <= high for total in d.roll_many(20, do_sum=True))
+        assert all(low <= d.sample_sum() <= high for _ in range(20))
+    assert rng.calls > 0
+
+
+def test_spawn_rngs_are_independent():
+    streams = spawn_rngs(RandomStream(99), 4)
+    assert len(streams) == 4
+    rolls = [tuple(stream.integers(1, 1001, 10)) for stream in streams]
+    assert len(set(rolls)) == 4
+
+    with pytest.raises(TypeError):
+        spawn_rngs(CountingRNG(), 2)
+
+
+def test_spawn_numpy_rngs():
+    numpy = pytest.importorskip("numpy")
+    streams = spawn_rngs(numpy.random.default_rng(99), 3)
+    assert all(isinstance(stream, numpy.random.Generator) for stream in streams)
+    rolls = [tuple(stream.integers(1, 1001, 10)) for stream in streams]
+    assert len(set(rolls)) == 3
+
+
+def test_stream_draws_match_choices():
+    # The draws for a size are those of random.choices on Python 3.6 and later
+    values = RandomStream(3).integers(1, 7, 20)
+    answer = random.Random(3).choices(range(1, 7), k=20)
+    assert values == answer
@@ -0,0 +1,65 @@
+import pytest
+
+import dice.dice
+from dice.dice import Dice
+
+
+TEST_RANGES = (
+    # dice_str, number kept, lowest value, highest value
+    ("3d6", 3, 1, 6),
+    ("4dF", 4, -1, 1),
+    ("4(dF-1)-L", 3, -2, 0),
+    ("5(d4-2)", 5, 0, 2),
+    ("7(d20+1)-L-2H", 4, 2, 21),
+)
+
+
+def check_unsummed(rolls, n, kept, low, high):
+    assert len(rolls) == n
+    for row in rolls:
+        assert len(row) == kept
+        assert all(low <= value <= high for value in row)
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(dice.dice, "numpy", None)
+    return request.param
+
+
+def test_roll_many_unsummed(backend):
+    for dice_str, kept, low, high in TEST_RANGES:
+        rolls = Dice(dice_str).roll_many(200)
+        check_unsummed(rolls, 200, kept, low, high)
+
+
+def test_roll_many_summed(backend):
+    for dice_str, kept, low, high in TEST_RANGES:
+        rolls = Dice(dice_str).roll_many(200, do_sum=True)
+        assert len(rolls) == 200
+        assert all(kept * low <= value <= kept * high for value in rolls)
+
+
+def test_roll_many_global_mod(backend):
+    rolls = Dice("5(d10-1)+15-3L-H").roll_many(200)
+    assert len(rolls) == 200
+    assert all(15 <= value <= 15 + 9 for value in rolls)
+
+
+def test_roll_many_sorted_after_drop(backend):
+    rolls = Dice("6d6-L-H").roll_many(200)
+    for row in rolls:
+        assert list(row) == sorted(row)
+
+
+def test_roll_many_zero(backend):
+    assert len(Dice("3d6").roll_many(0)) == 0
+
+
+def test_roll_many_negative():
+    with pytest.raises(ValueError) as err_info:
+        Dice("3d6").roll_many(-1)
+    assert err_info.match(r"Number of rolls -1 is less than 0.")
@@ -0,0 +1,51 @@
+import pytest
+
+from dice.dice import Dice, RollPlan, compile
+import pickle
+
+
+def test_compile_values():
+    TEST_PAIRS = (
+        ("3d6", (3, 6, 0, 0, 0, 0)),
+        ("4dF", (4, "F", 0, 0, 0, 0)),
+        ("10d7+4", (10, 7, 0, 4, 0, 0)),
+        ("7(d20+1)-L-2H", (7, 20, 1, 0, 2, 1)),
+        ("5(d10-1)+15-3L-H", (5, 10, -1, 15, 1, 3)),
+    )
+
+    for dice_str, answer in TEST_PAIRS:
+        plan = compile(dice_str)
+        assert isinstance(plan, RollPlan)
+        assert plan.values() == answer
+        assert plan == Dice(dice_str).plan
+
+
+def test_plan_is_immutable():
+    plan = compile("3d6")
+    with pytest.raises(AttributeError):
+        plan.number = 4
+    with pytest.raises(AttributeError):
+        del plan.size
+    with pytest.raises(AttributeError):
+        plan.extra = 1
+
+
+def test_plan_pickles():
+    for dice_str in ("3d6", "4(dF-1)-L", "5(d10-1)+15-3L-H"):
+        plan = compile(dice_str)
+        copy = pickle.loads(pickle.dumps(plan))
+        assert copy == plan
+        assert hash(copy) == hash(plan)
+        assert copy.do_sum == plan.do_sum
+
+
+def test_plan_rolls():
+    plan = compile("3(d6+1)-L")
+    for _ in range(100):
+        values = plan.roll()
+        assert len(values) == 2
+        assert all(2 <= value <= 7 for value in values)
+
+    plan = compile("2d6+3")
+    for _ in range(100):
+        assert 5 <= plan.roll() <= 15
@@ -0,0 +1,134 @@
+import pytest
+
+from dice.server import LatencyStats, RollServer
+
+import asyncio
+import json
+import os
+import socket
+import tempfile
+
+
+def run(coroutine):
+    """ Run coroutine on a fresh event loop. """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def exchange(reader, writer, requests):
+    """ Send every request at once, then read one response per request. """
+    writer.write(b"".join(json.dumps(request).encode() + b"\n" for request in requests))
+    await writer.drain()
+    responses = []
+    for _ in requests:
+        responses.append(json.loads((await reader.readline()).decode()))
+    return {response["id"]: response for response in responses}
+
+
+def test_latency_stats():
+    stats = LatencyStats(window=100)
+    assert stats.snapshot() == {"count": 0, "p50_ms": None, "p99_ms": None}
+
+    for i in range(1, 201):
+        stats.record(i / 1000.)
+    # Only the last 100 latencies are kept
+    assert stats.count == 200
+    assert stats.percentile(50) == pytest.approx(0.150)
+    assert stats.percentile(99) == pytest.approx(0.199)
+    assert stats.percentile(0) == pytest.approx(0.101)
+
+
+def test_server_rolls_and_batches():
+    async def session():
+        roll_server = RollServer()
+        server = await roll_server.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+        requests = [{"id": i, "notation": "3d6", "sum": True} for i in range(50)]
+        requests += [{"id": 50 + i, "notation": "4d6-L"} for i in range(10)]
+        requests += [
+            {"id": "bad", "notation": "3d1"},
+            {"id": "missing"},
+        ]
+        responses = await exchange(reader, writer, requests)
+        stats = (await exchange(reader, writer, [{"id": "stats", "stats": True}]))["stats"]["stats"]
+
+        writer.close()
+        await roll_server.close()
+        return responses, stats
+
+    responses, stats = run(session())
+
+    for i in range(50):
+        assert 3 <= responses[i]["result"] <= 18
+    for i in range(50, 60):
+        assert len(responses[i]["result"]) == 3
+    assert responses["bad"]["error"] == "Die size of 1 is less than 2."
+    assert responses["missing"]["error"] == "Request has no 'notation'."
+
+    # Requests for the same notation share one roll
+    assert stats["count"] == 62
+    assert stats["batches"] < 60
+    assert stats["p50_ms"] <= stats["p99_ms"]
+
+
+def test_server_bad_json():
+    async def session():
+        roll_server = RollServer()
+        server = await roll_server.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+        writer.write(b"not json\n[1, 2]\n")
+        responses = [json.loads((await reader.readline()).decode()) for _ in range(2)]
+
+        writer.close()
+        await roll_server.close()
+        return responses
+
+    for response in run(session()):
+        assert response["id"] is None
+        assert "error" in response
+
+
+def test_server_caps_pending_requests():
+    async def session():
+        roll_server = RollServer(max_pending=2)
+        server = await roll_server.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        responses = await exchange(reader, writer, [{"id": i, "notation": "1d6", "sum": True} for i in range(20)])
+        writer.close()
+        await roll_server.close()
+        return responses, roll_server.stats()
+
+    # Only two requests are read at a time, but every request is answered
+    responses, stats = run(session())
+    assert sorted(responses) == list(range(20))
+    assert stats["batches"] >= 10
+
+    with pytest.raises(ValueError) as err_info:
+        RollServer(max_pending=0)
+    assert err_info.match(r"Maximum pending requests 0 is less than 1.")
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets are not available")
+def test_server_unix_socket():
+    async def session(path):
+        roll_server = RollServer()
+        await roll_server.start(path=path)
+        reader, writer = await asyncio.open_unix_connection(path)
+        responses = await exchange(reader, writer, [{"id": 1, "notation": "1d20", "sum": True}])
+        writer.close()
+        await roll_server.close()
+        return responses
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "dice.sock")
+        responses = run(session(path))
+
+    assert 1 <= responses[1]["result"] <= 20
@@ -0,0 +1,37 @@
+import pytest
+
+import dice.dice
+from dice.dice import simulate
+
+
+def test_simulate_counts():
+    counts = simulate("2d6", 10000, workers=2, seed=1)
+    assert sum(counts.values()) == 10000
+    assert set(counts) <= set(range(2, 13))
+
+
+def test_simulate_is_reproducible():
+    first = simulate("8d6-2L+4", 5000, workers=2, seed=7, chunk_size=1000)
+    second = simulate("8d6-2L+4", 5000, workers=2, seed=7, chunk_size=1000)
+    assert first == second
+    assert set(first) <= set(range(10, 41))
+
+
+def test_simulate_single_worker_without_numpy(monkeypatch):
+    monkeypatch.setattr(dice.dice, "numpy", None)
+    counts = simulate("3dF", 500, workers=1, seed=3)
+    assert sum(counts.values()) == 500
+    assert set(counts) <= set(range(-3, 4))
+
+
+def test_simulate_errors():
+    with pytest.raises(ValueError) as err_info:
+        simulate("3d6", -1)
+    assert err_info.match(r"Number of rolls -1 is less than 0.")
+
+    with pytest.raises(ValueError) as err_info:
+        simulate("3d6", 10, workers=0)
+    assert err_info.match(r"Number of workers 0 is less than 1.")
+
+    with pytest.raises(ValueError):
+        simulate("1d6-L", 10)
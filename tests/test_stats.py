@@ -0,0 +1,96 @@
+import pytest
+
+import dice.dice
+from dice.dice import Dice, DiceStats, compile
+
+
+def test_stats_match_distribution():
+    for dice_str in (
+        "3d6",
+        "1d20+4",
+        "4dF",
+        "2(dF-1)-3",
+        "3(d6-2)",
+        "5(d4-3)+2",
+        "4d6-L",
+        "7(d20+1)-L-2H",
+        "3d6!4",
+        "4d10r1",
+        "2(d10!3-8)",
+        "4(d6r2-4)>=1",
+        "3(d8!2-5)=0",
+        "10d10>=8+1",
+        "6d6-2L<3",
+        "3d6 + 2d8 - 1d4 + 5",
+    ):
+        stats = Dice(dice_str).stats(quantiles=(5, 25, 50, 75, 95))
+        distribution = Dice(dice_str).distribution()
+        assert stats.mean == pytest.approx(distribution.mean())
+        assert stats.variance == pytest.approx(distribution.variance())
+        assert stats.minimum == distribution.minimum
+        assert stats.maximum == distribution.maximum
+        for q, total in stats.quantiles:
+            assert total == distribution.percentile(q)
+        assert len(stats.quantiles) == 5
+
+
+def test_stats_closed_form():
+    stats = Dice("2d6").stats(quantiles=(0, 50, 100))
+    assert isinstance(stats, DiceStats)
+    assert stats.mean == pytest.approx(7)
+    assert stats.variance == pytest.approx(35 / 6)
+    assert (stats.minimum, stats.maximum) == (2, 12)
+    assert stats.quantiles == ((0, 2), (50, 7), (100, 12))
+
+
+def test_stats_large_pool():
+    # A pool too large to enumerate, with the clamp from the local mod
+    stats = Dice("100000(d6-3)").stats()
+    faces = [0, 0, 0, 1, 2, 3]
+    mean = sum(faces) / 6
+    assert stats.mean == pytest.approx(100000 * mean)
+    assert stats.variance == pytest.approx(100000 * sum((face - mean) ** 2 for face in faces) / 6)
+    assert (stats.minimum, stats.maximum) == (0, 300000)
+    assert stats.quantiles == ()
+
+
+def test_stats_huge_die(monkeypatch):
+    def fail(*args):
+        raise AssertionError("Listed the faces of a die.")
+
+    monkeypatch.setattr(dice.dice, "_die_faces", fail)
+    size = 5000000
+    stats = Dice("3d{}".format(size)).stats()
+    assert stats.mean == pytest.approx(3 * (size + 1) / 2)
+    assert stats.variance == pytest.approx(3 * (size ** 2 - 1) / 12)
+    assert (stats.minimum, stats.maximum) == (3, 3 * size)
+
+    stats = Dice("2(d{}!3-{})+1".format(size, size // 2)).stats()
+    assert (stats.minimum, stats.maximum) == (1, 2 * (4 * size - size // 2) + 1)
+
+
+def test_stats_without_quantiles_skip_distribution(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("The distribution was built")
+
+    monkeypatch.setattr(dice.dice.RollPlan, "distribution", fail)
+    stats = Dice("40d12+3").stats()
+    assert stats.mean == pytest.approx(40 * 6.5 + 3)
+    assert stats.quantiles == ()
+
+
+def test_stats_are_memoized(monkeypatch):
+    plan = compile("8d6-2L")
+    first = plan.stats()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Stats were recomputed")
+
+    monkeypatch.setattr(dice.dice, "_moments", fail)
+    assert Dice("8d6-2l").stats() is first
+
+
+def test_stats_bad_quantile():
+    with pytest.raises(ValueError) as err_info:
+        Dice("3d6").stats(quantiles=(50, 101))
+    assert err_info.match(r"Percentile 101 is not between 0 and 100.")
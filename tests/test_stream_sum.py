@@ -0,0 +1,68 @@
+import pytest
+
+import dice.dice
+from dice.dice import RandomStream, compile
+
+import tracemalloc
+
+
+class SequenceRNG:
+    """ A generator that returns the dice values from a fixed sequence. """
+    def __init__(self, values):
+        self.values = list(values)
+
+    def integers(self, low, high, size=None):
+        drawn, self.values = self.values[:size], self.values[size:]
+        assert all(low <= value < high for value in drawn)
+        return drawn
+
+    def random(self):
+        raise AssertionError("random() should not be needed")
+
+
+def expected_sum(values, plan):
+    """ Sum the dice the slow way, sorting all of them. """
+    values = [value + plan.local_mod for value in values]
+    if plan.size != "F":
+        values = [max(value, 0) for value in values]
+    kept = sorted(values)[plan.lowest_mod:plan.number - plan.highest_mod]
+    if plan.success is not None:
+        kept = [dice.dice._score(value, plan.success) for value in kept]
+    return sum(kept) + plan.global_mod
+
+
+def test_stream_sum_matches_sorted_sum(monkeypatch):
+    # Small chunks so that every roll spans several of them
+    monkeypatch.setattr(dice.dice, "STREAM_CHUNK_SIZE", 7)
+    stream = RandomStream(42)
+    for dice_str in ("50d6", "50d6+3", "50(d6-2)", "50d6-5L", "50d6-3H-4L", "50(dF+1)-2L", "50d10-L>=7"):
+        plan = compile(dice_str)
+        low = -1 if plan.size == "F" else 1
+        high = 1 if plan.size == "F" else plan.size
+        for _ in range(20):
+            values = stream.integers(low, high + 1, plan.number)
+            assert plan.stream_sum(SequenceRNG(values)) == expected_sum(values, plan)
+
+
+def test_large_summed_rolls_stream(monkeypatch):
+    monkeypatch.setattr(dice.dice, "STREAM_CHUNK_SIZE", 10)
+    plan = compile("30d6-2L")
+    values = RandomStream(7).integers(1, 7, 30)
+    assert plan.roll(True, SequenceRNG(values)) == expected_sum(values, plan)
+
+    # Unsummed rolls still return every die
+    assert len(plan.roll(rng=1)) == 28
+
+
+def test_stream_sum_memory_is_bounded():
+    plan = compile("100000d6-10L-10H")
+    tracemalloc.start()
+    try:
+        total = plan.roll(True, rng=3)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert 99980 <= total <= 99980 * 6
+    # A list of every die alone would take 800 kB
+    assert peak < 200000
@@ -0,0 +1,97 @@
+import pytest
+
+from dice.dice import Dice, ThreadLocalStream, as_rng, spawn_rngs
+
+import copy
+import pickle
+import threading
+
+
+THREADS = 8
+ROLLS = 2000
+
+
+def run_threads(target):
+    """ Start THREADS threads running target(index) together and return
+    their results in index order.
+
+    """
+    results = [None] * THREADS
+    barrier = threading.Barrier(THREADS)
+
+    def worker(index):
+        barrier.wait()
+        results[index] = target(index)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_dice_are_immutable():
+    d = Dice("4d6-L")
+    for name in ("dice_str", "rng", "trace", "plan", "number"):
+        with pytest.raises(AttributeError):
+            setattr(d, name, None)
+    with pytest.raises(AttributeError):
+        del d.plan
+    with pytest.raises(AttributeError):
+        d.extra = 1
+
+
+def test_dice_copy_and_pickle():
+    for d in (Dice("4d6-L"), Dice("3d6 + 2", rng=7, trace=False), Dice("2d20", rng="thread")):
+        for other in (copy.copy(d), copy.deepcopy(d), pickle.loads(pickle.dumps(d))):
+            assert other.dice_str == d.dice_str
+            assert other.plan == d.plan
+            assert other.trace == d.trace
+
+    # A pickled seeded stream keeps its state, and a shallow copy shares it
+    d = Dice("10d6", rng=3)
+    d.roll()
+    assert pickle.loads(pickle.dumps(d)).roll() == d.roll()
+    assert copy.copy(d).rng is d.rng
+    assert copy.copy(Dice("2d20", rng="thread")).rng is as_rng("thread")
+
+
+def test_thread_local_stream():
+    stream = as_rng("thread")
+    assert isinstance(stream, ThreadLocalStream)
+    assert stream.stream() is stream.stream()
+
+    # Every thread gets a stream of its own
+    streams = run_threads(lambda index: stream.stream())
+    assert len(set(map(id, streams))) == THREADS
+
+
+def test_shared_dice_reproducible_across_threads():
+    # One instance rolled from every thread at once gives each thread exactly
+    # the rolls it gets when run alone.
+    d = Dice("4(d6!+1)-L")
+    rngs = spawn_rngs(1234, THREADS)
+    threaded = run_threads(lambda index: [d.roll(True, rngs[index]) for _ in range(ROLLS)])
+
+    rngs = spawn_rngs(1234, THREADS)
+    for index in range(THREADS):
+        assert threaded[index] == [d.roll(True, rngs[index]) for _ in range(ROLLS)]
+
+
+def test_per_thread_rolls_are_independent():
+    d = Dice("3d20", rng=ThreadLocalStream(seed=99))
+    results = run_threads(lambda index: [d.roll() for _ in range(ROLLS)])
+
+    for rolls in results:
+        assert all(1 <= value <= 20 for roll in rolls for value in roll)
+    # No two threads share a sequence of rolls
+    assert len({tuple(map(tuple, rolls)) for rolls in results}) == THREADS
+
+    # The threads used separate streams, so the rolls from one thread do not
+    # predict another's: each pair of threads agrees on about 1 in 20 dice.
+    flat = [[value for roll in rolls for value in roll] for rolls in results]
+    for i in range(THREADS):
+        for j in range(i + 1, THREADS):
+            matches = sum(a == b for a, b in zip(flat[i], flat[j]))
+            assert matches < 2 * len(flat[i]) / 20
@@ -1,10 +1,14 @@
 import pytest
 
-from dice.dice import DiceTokenizer
+from dice.dice import CharDiceTokenizer, DiceTokenizer
 import re
 
 
-def test_dice_tokenizer():
+TOKENIZERS = (CharDiceTokenizer, DiceTokenizer)
+
+
+@pytest.mark.parametrize("tokenizer", TOKENIZERS)
+def test_dice_tokenizer(tokenizer):
     TEST_PAIRS = (
         ("0d0", ("0", "d0")),
         ("3d6", ("3", "d6")),
@@ -21,11 +25,12 @@ def test_dice_tokenizer():
     )
 
     for dice_str, answer in TEST_PAIRS:
-        tokens = tuple(DiceTokenizer(dice_str))
+        tokens = tuple(tokenizer(dice_str))
         assert tokens == answer
 
 
-def test_dice_tokenizer_raise():
+@pytest.mark.parametrize("tokenizer", TOKENIZERS)
+def test_dice_tokenizer_raise(tokenizer):
     TESTS = (
         "3$5",
         "#4d5-L-H",
@@ -33,6 +38,48 @@ def test_dice_tokenizer_raise():
     )
     for format_str in TESTS:
         with pytest.raises(ValueError) as err_info:
-            tokens = tuple(DiceTokenizer(format_str))
+            tokens = tuple(tokenizer(format_str))
         match_str = r"Illegal character '.+' found in dice format string!"
         assert err_info.match(match_str)
+
+
+def test_dice_tokenizer_whitespace():
+    TEST_PAIRS = (
+        ("3d6 + 2", ("3", "d6", "+2")),
+        (" 3d6 +2d8\t- 1 ", ("3", "d6", "+2", "d8", "-1")),
+        ("4d6 -L", ("4", "d6", "-L")),
+    )
+    for dice_str, answer in TEST_PAIRS:
+        assert DiceTokenizer.tokenize(dice_str) == answer
+
+    # Whitespace between digits or inside a set of dice is not a separator
+    for dice_str in ("3d6 2", "1 0d6", "3 d6", "3d 6", "3(d6 )"):
+        with pytest.raises(ValueError) as err_info:
+            DiceTokenizer.tokenize(dice_str)
+        assert err_info.match(r"Illegal character ' ' found in dice format string!")
+
+
+def test_dice_tokenizer_edge_cases():
+    TESTS = (
+        "",
+        "-",
+        "--",
+        "3d6+",
+        "3d6+4-",
+        "3dd6",
+        "3d6)(",
+        ")3",
+        "FF",
+    )
+    for dice_str in TESTS:
+        assert tuple(DiceTokenizer(dice_str)) == tuple(CharDiceTokenizer(dice_str))
+
+
+def test_tokenize_many():
+    TESTS = ("3d6", "7(d20+1)-L-2H", "3d6", "4dF")
+    answer = [tuple(CharDiceTokenizer(dice_str)) for dice_str in TESTS]
+    assert DiceTokenizer.tokenize_many(TESTS) == answer
+
+    with pytest.raises(ValueError) as err_info:
+        DiceTokenizer.tokenize_many(["3d6", "3$6"])
+    assert err_info.match(r"Illegal character '\$' found in dice format string!")